@@ -0,0 +1,144 @@
+"""Buffered, batched write path for high-volume inserts such as quiz attempts.
+
+In ``sync`` mode :meth:`BatchWriter.submit` hands rows straight to the flush
+callback, which keeps behaviour deterministic for tests and development. In
+``buffered`` mode rows go onto a bounded in-process queue that a background
+thread drains, passing the callback batches of up to ``max_batch_size`` rows
+at most ``max_latency`` seconds after the first row of a batch arrived.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchWriter:
+    """Queue rows and pass them to ``flush(rows)`` in batches.
+
+    ``flush`` receives a list of row dicts and must persist and commit them;
+    in buffered mode it runs inside a fresh app context on the writer thread.
+    """
+
+    def __init__(self, flush=None, mode='sync', max_batch_size=500, max_latency=0.05,
+                 max_queue_size=10000, enqueue_timeout=1.0):
+        self.flush = flush
+        self.mode = mode
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app, flush, config_prefix):
+        """Configure from ``<config_prefix>_WRITE_MODE``, ``_BATCH_SIZE``,
+        ``_BATCH_LATENCY``, ``_QUEUE_SIZE`` and ``_ENQUEUE_TIMEOUT``."""
+        config = app.config
+        self.app = app
+        self.flush = flush
+        self.mode = config.setdefault(f'{config_prefix}_WRITE_MODE', self.mode)
+        if self.mode not in ('sync', 'buffered'):
+            raise ValueError(f"{config_prefix}_WRITE_MODE must be 'sync' or 'buffered', not {self.mode!r}")
+        self.max_batch_size = config.setdefault(f'{config_prefix}_BATCH_SIZE', self.max_batch_size)
+        self.max_latency = config.setdefault(f'{config_prefix}_BATCH_LATENCY', self.max_latency)
+        self.max_queue_size = config.setdefault(f'{config_prefix}_QUEUE_SIZE', self.max_queue_size)
+        self.enqueue_timeout = config.setdefault(f'{config_prefix}_ENQUEUE_TIMEOUT', self.enqueue_timeout)
+        atexit.register(self.shutdown)
+
+    def submit(self, rows):
+        """Persist ``rows`` now (sync mode) or queue them for the writer thread.
+
+        When the queue stays full for ``enqueue_timeout`` seconds the caller
+        writes the remaining rows itself, so a slow database pushes back on
+        request threads instead of losing data.
+        """
+        if self.mode == 'sync':
+            self.flush(list(rows))
+            return
+        pending = list(rows)
+        self._ensure_started()
+        for index, row in enumerate(pending):
+            try:
+                self._queue.put(row, timeout=self.enqueue_timeout)
+            except queue.Full:
+                logger.warning('Write queue full; writing %d rows synchronously', len(pending) - index)
+                self.flush(pending[index:])
+                return
+
+    def wait(self):
+        """Block until every queued row has been flushed."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def shutdown(self):
+        """Flush everything still queued and stop the writer thread."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    # --- Writer thread ---
+    def _ensure_started(self):
+        # Threads do not survive fork(), so a worker process forked from a
+        # preloaded parent starts its own queue and writer on first use.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='batch-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        q = self._queue
+        stopping = False
+        while not stopping:
+            item = q.get()
+            if item is _STOP:
+                q.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    q.task_done()
+                    break
+                batch.append(item)
+            self._write(batch)
+            for _ in batch:
+                q.task_done()
+
+    def _write(self, batch):
+        with self.app.app_context():
+            try:
+                self.flush(batch)
+                return
+            except Exception:
+                logger.exception('Batch write of %d rows failed; retrying row by row', len(batch))
+        # Isolate the offending rows so one bad row does not drop the batch.
+        for row in batch:
+            with self.app.app_context():
+                try:
+                    self.flush([row])
+                except Exception:
+                    logger.exception('Dropping row that could not be written: %r', row)
@@ -0,0 +1 @@
+"""Performance tooling: synthetic datasets, benchmarks and query-plan checks."""
@@ -0,0 +1,66 @@
+"""Measure login (password verification) throughput per hashing setting.
+
+For each Werkzeug method string, reports verifications per second on one core
+(inline, as a request thread would run it) and through the same bounded
+process pool the app uses::
+
+    python -m benchmarks.bench_password_hashing --workers 4 --seconds 3
+    python -m benchmarks.bench_password_hashing --method pbkdf2:sha256:600000 --method scrypt:16384:8:1
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from password_hashing import PasswordHasher
+
+DEFAULT_METHODS = (
+    'pbkdf2:sha256:1000000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:260000',
+    'scrypt:32768:8:1',
+    'scrypt:16384:8:1',
+)
+
+
+def measure(hasher, stored_hash, seconds, concurrency):
+    """Run verifications from ``concurrency`` threads for ``seconds``; return count/sec."""
+    deadline = time.perf_counter() + seconds
+
+    def loop():
+        count = 0
+        while time.perf_counter() < deadline:
+            assert hasher.verify(stored_hash, 'correct horse battery staple')
+            count += 1
+        return count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as threads:
+        total = sum(threads.map(lambda _: loop(), range(concurrency)))
+    return total / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--method', action='append', dest='methods', help='Method string to measure (repeatable).')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Process pool size.')
+    parser.add_argument('--seconds', type=float, default=2.0, help='Measurement time per setting.')
+    args = parser.parse_args(argv)
+
+    print(f'{"method":<24} {"ms/login":>9} {"logins/s/core":>14} {"pool logins/s":>14} {"per worker":>11}')
+    for method in args.methods or DEFAULT_METHODS:
+        inline = PasswordHasher(method=method, workers=0)
+        stored_hash = inline.hash('correct horse battery staple')
+        per_core = measure(inline, stored_hash, args.seconds, concurrency=1)
+
+        pooled = PasswordHasher(method=method, workers=args.workers)
+        pooled.verify(stored_hash, 'warm up the pool')
+        pool_rate = measure(pooled, stored_hash, args.seconds, concurrency=args.workers * 2)
+        pooled.shutdown()
+
+        print(f'{method:<24} {1000 / per_core:>9.1f} {per_core:>14.1f} {pool_rate:>14.1f} '
+              f'{pool_rate / args.workers:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
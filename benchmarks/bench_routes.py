@@ -0,0 +1,331 @@
+"""Load-test the hot routes and fail on regressions against a stored baseline.
+
+Builds a seeded synthetic database (see :mod:`benchmarks.datagen`), then
+drives each route through the Flask test client (in-process, one request at a
+time) and through a threaded Werkzeug server on localhost with concurrent
+clients. Reports p50/p95/p99 latency, throughput and SQL statements per
+request::
+
+    python -m benchmarks.bench_routes --scale small --compare
+    python -m benchmarks.bench_routes --scale small --save-baseline
+
+``benchmarks/baselines/routes.json`` is the committed baseline for
+``--scale small`` with the default options, which ``--compare`` (an alias of
+``--baseline`` with that file as its default) checks against. Each client logs
+in as its own synthetic user. With ``--baseline`` the run
+exits non-zero when a route's p95 latency, throughput or mean SQL statements
+per request is worse than the baseline by more than ``--tolerance``, or when
+its median statement count grew at all. Routes run in a fixed order and earlier
+routes warm the caches later ones use, so compare runs made with the same
+options. Latency baselines are only comparable on the same machine and
+scale; the statement counts are not machine dependent.
+"""
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks import datagen
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'routes.json')
+QUERY_COUNT_HEADER = 'X-Bench-Queries'
+
+
+class Picker:
+    """Seeded choice of entity ids within the generated dataset."""
+
+    def __init__(self, scale, seed):
+        self.rng = random.Random(seed)
+        self.courses = scale['courses']
+        self.lessons = self.courses * scale['modules_per_course'] * scale['lessons_per_module']
+        self.quizzes = self.lessons * scale['quizzes_per_lesson']
+        self.users = scale['users']
+
+    def course(self):
+        return self.rng.randint(1, self.courses)
+
+    def lesson(self):
+        return self.rng.randint(1, self.lessons)
+
+    def quiz(self):
+        return self.rng.randint(1, self.quizzes)
+
+    def user(self):
+        return self.rng.randint(1, self.users)
+
+    def language(self):
+        return self.rng.choice(datagen.LANGUAGES).lower()
+
+    def answer(self):
+        return self.rng.choice(('Alpha', 'Beta', 'Gamma', 'Delta'))
+
+
+# name -> (method, build(picker) -> (url, form data), needs a logged-in client)
+ROUTES = {
+    'login': ('POST', lambda p: ('/login', {'email': f'user{p.user()}@example.com', 'password': datagen.PASSWORD}), False),
+    'courses': ('GET', lambda p: ('/courses', None), True),
+    'course_detail': ('GET', lambda p: (f'/course/{p.course()}', None), True),
+    'lesson_view': ('GET', lambda p: (f'/lesson/{p.lesson()}', None), True),
+    'take_quiz': ('GET', lambda p: (f'/quiz/{p.quiz()}/take', None), True),
+    'submit_quiz': ('POST', lambda p: (f'/quiz/{p.quiz()}/take', {'selected_answer': p.answer()}), True),
+    'enroll': ('POST', lambda p: (f'/enroll/{p.course()}', None), True),
+    'api_courses': ('GET', lambda p: (f'/api/courses/{p.language()}', None), False),
+    'api_course_tree': ('GET', lambda p: (f'/api/courses/{p.course()}', None), False),
+    'api_progress': ('GET', lambda p: ('/api/progress?scope=lesson', None), True),
+}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(latencies, queries, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'queries': round(sum(queries) / len(queries), 2),
+        'queries_p50': percentile(sorted(queries), 50),
+    }
+
+
+def install_query_counter(app, engine):
+    """Count SQL statements per request and report them in a response header."""
+    from sqlalchemy import event
+
+    local = threading.local()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if getattr(local, 'count', None) is not None:
+            local.count += 1
+
+    @app.before_request
+    def start_count():
+        local.count = 0
+
+    @app.after_request
+    def report_count(response):
+        response.headers[QUERY_COUNT_HEADER] = str(local.count or 0)
+        local.count = None
+        return response
+
+
+# --- Clients ---
+class TestClientSession:
+    def __init__(self, app, use_cookies=True):
+        self.client = app.test_client(use_cookies=use_cookies)
+
+    def request(self, method, url, data):
+        response = self.client.open(url, method=method, data=data)
+        response.close()
+        return response.status_code, int(response.headers.get(QUERY_COUNT_HEADER, 0))
+
+
+class HTTPSession:
+    """Minimal cookie-keeping HTTP client over one ``http.client`` connection."""
+
+    def __init__(self, port, use_cookies=True):
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.use_cookies = use_cookies
+        self.cookies = {}
+
+    def request(self, method, url, data):
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        self.connection.request(method, url, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        for header in (response.headers.get_all('Set-Cookie') or ()) if self.use_cookies else ():
+            name, _, value = header.split(';', 1)[0].partition('=')
+            self.cookies[name.strip()] = value.strip()
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+        return response.status, int(response.getheader(QUERY_COUNT_HEADER, 0))
+
+
+def log_in(session, user_id):
+    status, _ = session.request('POST', '/login', {'email': f'user{user_id}@example.com', 'password': datagen.PASSWORD})
+    if status != 302:
+        raise RuntimeError(f'Logging in user{user_id} failed with HTTP {status}')
+    return session
+
+
+def run_route(sessions, anonymous, name, requests, scale, seed):
+    """Send ``requests`` requests for route ``name``, spread over the sessions' threads."""
+    method, build, needs_login = ROUTES[name]
+    pool = sessions if needs_login else anonymous
+    per_session = [requests // len(pool) + (i < requests % len(pool)) for i in range(len(pool))]
+    latencies, queries, errors = [], [], []
+
+    def drive(index):
+        picker = Picker(scale, seed * 1000 + index)
+        session = pool[index]
+        for _ in range(per_session[index]):
+            url, data = build(picker)
+            started = time.perf_counter()
+            status, count = session.request(method, url, data)
+            latencies.append(time.perf_counter() - started)
+            queries.append(count)
+            if status >= 400:
+                errors.append(f'{method} {url}: HTTP {status}')
+
+    started = time.perf_counter()
+    if len(pool) == 1:
+        drive(0)
+    else:
+        with ThreadPoolExecutor(max_workers=len(pool)) as threads:
+            list(threads.map(drive, range(len(pool))))
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(f'{len(errors)} failed requests, e.g. {errors[0]}')
+    return summarize(latencies, queries, elapsed)
+
+
+# --- Baselines ---
+def compare(results, baseline, tolerance):
+    """Return regression messages for ``results`` measured against ``baseline``."""
+    regressions = []
+    for mode, routes in results.items():
+        for name, current in routes.items():
+            previous = baseline.get(mode, {}).get(name)
+            if previous is None:
+                continue
+            if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                regressions.append(f'{mode} {name}: p95 {current["p95_ms"]}ms vs baseline {previous["p95_ms"]}ms')
+            if current['throughput'] < previous['throughput'] * (1 - tolerance):
+                regressions.append(f'{mode} {name}: {current["throughput"]} req/s vs baseline {previous["throughput"]}')
+            # The median is exact; the mean moves a little with data-dependent paths (insert vs update)
+            if (current['queries_p50'] > previous['queries_p50']
+                    or current['queries'] > previous['queries'] * (1 + tolerance)):
+                regressions.append(f'{mode} {name}: {current["queries"]} queries/request '
+                                   f'(median {current["queries_p50"]}) vs baseline {previous["queries"]} '
+                                   f'(median {previous["queries_p50"]})')
+    return regressions
+
+
+def print_table(mode, routes):
+    print(f'\n{mode}')
+    print(f'{"route":<15} {"requests":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"req/s":>9} {"queries":>8}')
+    for name, r in routes.items():
+        print(f'{name:<15} {r["requests"]:>8} {r["p50_ms"]:>9.2f} {r["p95_ms"]:>9.2f} {r["p99_ms"]:>9.2f} '
+              f'{r["throughput"]:>9.1f} {r["queries"]:>8.2f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    datagen.add_scale_arguments(parser)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--route', action='append', dest='routes', choices=sorted(ROUTES),
+                        help='Route to measure (repeatable; default: all).')
+    parser.add_argument('--mode', choices=('client', 'server', 'both'), default='both',
+                        help='Flask test client, threaded local server, or both.')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per route and mode.')
+    parser.add_argument('--login-requests', type=int, default=50, help='Requests for the (slow) login route.')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients in server mode.')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per route first.')
+    parser.add_argument('--cold-cache', action='store_true', help='Disable the catalog and fragment caches.')
+    parser.add_argument('--baseline', '--compare', nargs='?', const=DEFAULT_BASELINE,
+                        help='Compare against this baseline file (default: the committed one) and fail on regressions.')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help='Write results as the new baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed latency/throughput slowdown (0.25 = 25%%).')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file.')
+    args = parser.parse_args(argv)
+    scale = datagen.scale_from_args(args)
+
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    from werkzeug.serving import make_server
+
+    from app import create_app
+    from extensions import catalog, db
+
+    app = create_app({'WTF_CSRF_ENABLED': False, 'SCHEMA_CHECK_ON_STARTUP': False})
+    if args.cold_cache:
+        catalog.max_entries = 0
+        app.config['FRAGMENT_CACHE_ENABLED'] = False
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        datagen.generate(seed=args.seed, **scale)
+        print(f'Generated dataset {scale} in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+        engine = db.engine
+    install_query_counter(app, engine)
+
+    routes = args.routes or list(ROUTES)
+    modes = ('client', 'server') if args.mode == 'both' else (args.mode,)
+    users = Picker(scale, args.seed)
+    results = {}
+    server = None
+    try:
+        for mode in modes:
+            if mode == 'client':
+                make_session = lambda use_cookies=True: TestClientSession(app, use_cookies)
+                concurrency = 1
+            else:
+                logging.getLogger('werkzeug').setLevel(logging.WARNING) # No per-request access log
+                server = make_server('127.0.0.1', 0, app, threaded=True)
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                make_session = lambda use_cookies=True: HTTPSession(server.server_port, use_cookies)
+                concurrency = args.concurrency
+            sessions = [log_in(make_session(), users.user()) for _ in range(concurrency)]
+            # Anonymous clients drop cookies, so every login request really logs in
+            anonymous = [make_session(use_cookies=False) for _ in range(concurrency)]
+            results[mode] = {}
+            for name in routes:
+                count = args.login_requests if name == 'login' else args.requests
+                if args.warmup:
+                    run_route(sessions, anonymous, name, min(args.warmup, count), scale, args.seed + 1)
+                results[mode][name] = run_route(sessions, anonymous, name, count, scale, args.seed)
+            print_table(mode, results[mode])
+            if server is not None:
+                server.shutdown()
+                server = None
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = {'scale': scale, 'seed': args.seed, 'routes': routes, 'concurrency': args.concurrency,
+              'cold_cache': args.cold_cache, 'results': results}
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save_baseline)), exist_ok=True)
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nSaved baseline to {args.save_baseline}')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        # Earlier routes warm the caches later ones use, so only identical runs compare exactly
+        for key in ('scale', 'seed', 'routes', 'concurrency', 'cold_cache'):
+            if baseline.get(key) != report[key]:
+                print(f'\nWarning: baseline was recorded with a different {key}.', file=sys.stderr)
+        regressions = compare(results, baseline.get('results', {}), args.tolerance)
+        for message in regressions:
+            print(f'REGRESSION {message}')
+        print(f'\n{len(regressions)} regressions against {args.baseline}.')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
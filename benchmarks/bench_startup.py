@@ -0,0 +1,165 @@
+"""Measure how long a worker takes to boot and serve its first request.
+
+Two ways a server can start workers are compared against a seeded SQLite
+database in a temporary directory:
+
+- ``cold``: every worker is a fresh interpreter that imports the app, calls
+  ``create_app()`` and serves a request, as with gunicorn without
+  ``--preload``. Reported per phase (interpreter start, import, factory,
+  first request).
+- ``fork``: the app is built once and workers are forked from it, as with
+  ``gunicorn --preload``. Forked workers query the database concurrently,
+  which also checks that no pooled connection is shared across the fork.
+
+::
+
+    python -m benchmarks.bench_startup --runs 10 --workers 8
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_REQUEST = '/api/courses/spanish' # Touches the database and the catalog cache
+
+# Run in a fresh interpreter; prints its phase timings as JSON
+COLD_WORKER = f'''
+import json, sys, time
+started = time.monotonic()
+from app import create_app
+imported = time.monotonic()
+app = create_app()
+created = time.monotonic()
+response = app.test_client().get({FIRST_REQUEST!r})
+assert response.status_code == 200, response.status_code
+served = time.monotonic()
+print(json.dumps({{'started': started, 'import': imported - started, 'create_app': created - imported,
+                  'first_request': served - created, 'modules': len(sys.modules),
+                  'numpy_loaded': 'numpy' in sys.modules}}))
+'''
+
+
+def percentile(sorted_values, p):
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {'p50_ms': round(percentile(values, 50) * 1000, 1), 'p95_ms': round(percentile(values, 95) * 1000, 1),
+            'max_ms': round(values[-1] * 1000, 1)}
+
+
+def prepare_database(database_url):
+    """Create and seed the database in a child process, so this one imports nothing yet."""
+    script = ('from app import create_app\nfrom commands import create_initial_data\nfrom extensions import db\n'
+              'import migrations\napp = create_app({"SCHEMA_CHECK_ON_STARTUP": False})\n'
+              'with app.app_context():\n    migrations.upgrade(db.engine, db.metadata)\n    create_initial_data()\n')
+    subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=worker_env(database_url), check=True)
+
+
+def worker_env(database_url):
+    return {**os.environ, 'DATABASE_URL': database_url, 'PYTHONPATH': ROOT, 'PASSWORD_HASH_WORKERS': '0'}
+
+
+def run_cold(database_url, runs):
+    phases = {'total': [], 'interpreter': [], 'import': [], 'create_app': [], 'first_request': []}
+    modules = numpy_loaded = None
+    for _ in range(runs):
+        launched = time.monotonic()
+        output = subprocess.run([sys.executable, '-c', COLD_WORKER], cwd=ROOT, env=worker_env(database_url),
+                                check=True, capture_output=True, text=True).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        phases['interpreter'].append(timings['started'] - launched)
+        for name in ('import', 'create_app', 'first_request'):
+            phases[name].append(timings[name])
+        # Up to the first response; interpreter teardown is not part of booting
+        phases['total'].append(timings['started'] - launched + timings['import'] + timings['create_app']
+                               + timings['first_request'])
+        modules, numpy_loaded = timings['modules'], timings['numpy_loaded']
+    return {name: summarize(values) for name, values in phases.items()}, modules, numpy_loaded
+
+
+def run_fork(database_url, runs, workers):
+    """Preload once, then fork ``workers`` children ``runs`` times; return preload time and per-child stats."""
+    os.environ.update(worker_env(database_url))
+    sys.path.insert(0, ROOT)
+    started = time.monotonic()
+    from app import create_app
+    from extensions import db
+    app = create_app()
+    preload = time.monotonic() - started
+
+    first_requests = []
+    for _ in range(runs):
+        children = {}
+        for _ in range(workers):
+            read_end, write_end = os.pipe()
+            forked = time.monotonic()
+            pid = os.fork()
+            if pid == 0: # Worker: serve one request and report how long it took since the fork
+                os.close(read_end)
+                status = 1
+                try:
+                    response = app.test_client().get(FIRST_REQUEST)
+                    elapsed = time.monotonic() - forked
+                    os.write(write_end, json.dumps({'status': response.status_code, 'elapsed': elapsed}).encode())
+                    status = 0
+                finally:
+                    os._exit(status)
+            os.close(write_end)
+            children[pid] = read_end
+        for pid, read_end in children.items():
+            with os.fdopen(read_end) as pipe:
+                payload = pipe.read()
+            _, status = os.waitpid(pid, 0)
+            if status or not payload:
+                raise RuntimeError(f'Forked worker {pid} failed (exit status {status})')
+            result = json.loads(payload)
+            if result['status'] != 200:
+                raise RuntimeError(f'Forked worker {pid} got HTTP {result["status"]}')
+            first_requests.append(result['elapsed'])
+    # The parent's own pool still works after its children used (and dropped) theirs
+    with app.app_context():
+        db.session.execute(db.text('SELECT 1'))
+    return preload, summarize(first_requests)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='Cold boots, and rounds of forked workers.')
+    parser.add_argument('--workers', type=int, default=4, help='Workers forked per round.')
+    parser.add_argument('--mode', choices=('cold', 'fork', 'both'), default='both')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file.')
+    args = parser.parse_args(argv)
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db')
+    prepare_database(database_url)
+    report = {'runs': args.runs, 'workers': args.workers}
+
+    if args.mode in ('cold', 'both'):
+        phases, modules, numpy_loaded = run_cold(database_url, args.runs)
+        report['cold'] = {'phases': phases, 'modules': modules, 'numpy_loaded': numpy_loaded}
+        print(f'cold boot ({args.runs} runs, {modules} modules loaded, numpy loaded: {numpy_loaded})')
+        print(f'{"phase":<15} {"p50 ms":>9} {"p95 ms":>9} {"max ms":>9}')
+        for name, stats in phases.items():
+            print(f'{name:<15} {stats["p50_ms"]:>9.1f} {stats["p95_ms"]:>9.1f} {stats["max_ms"]:>9.1f}')
+    if args.mode in ('fork', 'both'):
+        preload, stats = run_fork(database_url, args.runs, args.workers)
+        report['fork'] = {'preload_ms': round(preload * 1000, 1), 'fork_to_first_response': stats}
+        print(f'\npreload once: {preload * 1000:.1f} ms; fork to first response '
+              f'({args.runs} x {args.workers} workers): p50 {stats["p50_ms"]:.1f} ms, '
+              f'p95 {stats["p95_ms"]:.1f} ms, max {stats["max_ms"]:.1f} ms')
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Fail when a hot route's SQL regresses to a full table scan.
+
+Builds a seeded SQLite database in a temporary directory, drives the hot
+routes through the Flask test client with the catalog cache disabled, and runs
+``EXPLAIN QUERY PLAN`` on every statement they issue. Exits non-zero if any
+plan scans a whole table without an index::
+
+    python -m benchmarks.check_query_plans --attempts 200000
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+
+from benchmarks import datagen
+
+def routes(scale):
+    """(method, url, form data) triples for the hot routes.
+
+    Ids are derived from ``scale`` like :class:`benchmarks.bench_routes.Picker`
+    does: the last course, its last lesson and that lesson's first quiz, and
+    the last forum post, so every preset resolves them. The forum cursors
+    encode 2100-01-01 and 2000-01-01 with id 0.
+    """
+    course = scale['courses']
+    lesson = course * scale['modules_per_course'] * scale['lessons_per_module']
+    quiz = (lesson - 1) * scale['quizzes_per_lesson'] + 1
+    post = scale['forum_posts']
+    return [
+        ('GET', '/courses', None),
+        ('GET', f'/course/{course}', None),
+        ('GET', f'/lesson/{lesson}', None),
+        ('GET', f'/quiz/{quiz}/take', None),
+        ('POST', f'/quiz/{quiz}/take', {'selected_answer': 'Beta'}),
+        ('GET', f'/lesson/{lesson}/quiz', None),
+        ('POST', f'/lesson/{lesson}/quiz', {f'answer-{quiz}': 'Beta'}),
+        ('GET', '/review', None),
+        ('POST', f'/enroll/{course}', None),
+        ('GET', '/enrolled-courses', None),
+        ('GET', '/profile', None),
+        ('GET', '/api/courses/spanish', None),
+        ('GET', '/api/languages', None),
+        ('GET', '/api/courses?level=Beginner&limit=5&cursor=Mw', None),
+        ('GET', f'/api/courses/{course}?fields[quiz]=id,question', None),
+        ('GET', '/api/progress?scope=lesson&cursor=Mw', None),
+        ('GET', '/forum', None),
+        ('GET', '/forum?language=Spanish&cursor=MjEwMC0wMS0wMVQwMDowMDowMHww', None),
+        ('GET', '/forum?topic=Grammar&cursor=MjEwMC0wMS0wMVQwMDowMDowMHww', None),
+        ('GET', '/forum?language=French&topic=Culture', None),
+        ('GET', f'/forum/post/{post}', None),
+        ('GET', f'/forum/post/{post}?cursor=MjAwMC0wMS0wMVQwMDowMDowMHww', None),
+        ('POST', f'/forum/post/{post}/reply', {'content': 'A reply from the plan check.'}),
+        ('GET', '/search?q=synthetic+question', None),
+        ('GET', '/api/search?q=lesson&kind=lesson', None),
+    ]
+
+
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def full_scans(connection, statement, parameters):
+    """Return the tables a statement reads with a bare full scan."""
+    cursor = connection.cursor()
+    try:
+        rows = cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    finally:
+        cursor.close()
+    return [match.group(1) for match in (FULL_SCAN.match(row[-1]) for row in rows) if match]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    datagen.add_scale_arguments(parser)
+    parser.add_argument('--verbose', action='store_true', help='Print every plan, not only regressions.')
+    args = parser.parse_args(argv)
+    scale = datagen.scale_from_args(args)
+
+    from sqlalchemy import event, text
+
+    from app import create_app
+    from extensions import catalog, db, search_index
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'query_plans.db'),
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+        'SCHEMA_CHECK_ON_STARTUP': False,
+    })
+    with app.app_context():
+        db.create_all()
+        datagen.generate(**scale)
+        search_index.rebuild() # Built once up front; only the queries belong to the routes
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+        engine = db.engine
+    catalog.max_entries = 0 # Every request goes to the database
+
+    client = app.test_client()
+    client.post('/login', data={'email': 'user1@example.com', 'password': datagen.PASSWORD})
+
+    captured = []
+    route = None
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+            return
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        captured.append((route, statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    hot_routes = routes(scale)
+    for method, url, data in hot_routes:
+        route = f'{method} {url}'
+        response = client.open(url, method=method, data=data)
+        if response.status_code >= 400:
+            print(f'{route}: HTTP {response.status_code}', file=sys.stderr)
+            return 2
+    event.remove(engine, 'before_cursor_execute', capture)
+
+    failures = 0
+    seen = set()
+    connection = engine.raw_connection()
+    try:
+        for route, statement, parameters in captured:
+            if (route, statement) in seen:
+                continue
+            seen.add((route, statement))
+            scans = full_scans(connection, statement, parameters)
+            if scans:
+                failures += 1
+                print(f'FULL SCAN of {", ".join(scans)} in {route}:\n    {" ".join(statement.split())}')
+            elif args.verbose:
+                print(f'ok  {route}: {" ".join(statement.split())[:100]}')
+    finally:
+        connection.close()
+
+    print(f'Checked {len(seen)} statements across {len(hot_routes)} routes: {failures} full scans.')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Synthetic dataset generator for benchmarks and query-plan checks.
+
+Rows are written with multi-row Core inserts and client-assigned primary keys,
+so the target database must be empty. Every generated user has the password
+``password`` and the email ``user<N>@example.com``. Scales are named presets
+(``--scale large``) with any count overridable on the command line.
+"""
+import datetime
+import random
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+import models
+from extensions import db
+
+PASSWORD = 'password'
+
+DEFAULT_SCALE = {
+    'users': 2000,
+    'courses': 50,
+    'modules_per_course': 4,
+    'lessons_per_module': 5,
+    'quizzes_per_lesson': 3,
+    'attempts': 100000,
+    'enrollments_per_user': 3,
+    'forum_posts': 2000,
+    'comments_per_post': 5,
+}
+
+# 'large' writes a million enrollments and two million attempts
+SCALES = {
+    'small': {**DEFAULT_SCALE, 'users': 200, 'courses': 10, 'attempts': 10000, 'forum_posts': 200},
+    'default': DEFAULT_SCALE,
+    'large': {**DEFAULT_SCALE, 'users': 50000, 'courses': 200, 'attempts': 2000000,
+              'enrollments_per_user': 20, 'forum_posts': 20000},
+}
+
+LANGUAGES = ('Spanish', 'French', 'German', 'Italian', 'Japanese')
+LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+
+
+def add_scale_arguments(parser):
+    parser.add_argument('--scale', choices=sorted(SCALES), default='default', help='Dataset size preset.')
+    for name in DEFAULT_SCALE:
+        parser.add_argument('--' + name.replace('_', '-'), type=int, help=f'Override the preset {name} count.')
+
+
+def scale_from_args(args):
+    """The preset chosen with ``--scale`` plus any per-count overrides."""
+    overrides = {name: getattr(args, name) for name in DEFAULT_SCALE if getattr(args, name) is not None}
+    return {**SCALES[args.scale], **overrides}
+
+
+def generate(seed=42, chunk_size=10000, **scale):
+    """Fill the database of the current app (inside an app context); return the scale used."""
+    scale = {**DEFAULT_SCALE, **scale}
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+
+    def write(model_or_table, rows):
+        for start in range(0, len(rows), chunk_size):
+            db.session.execute(insert(model_or_table), rows[start:start + chunk_size])
+
+    password_hash = generate_password_hash(PASSWORD)
+    write(models.User, [
+        {'id': i, 'email': f'user{i}@example.com', 'password_hash': password_hash,
+         'chosen_language': rng.choice(LANGUAGES)}
+        for i in range(1, scale['users'] + 1)
+    ])
+
+    courses, modules, lessons, quizzes = [], [], [], []
+    for course_id in range(1, scale['courses'] + 1):
+        language, level = LANGUAGES[course_id % len(LANGUAGES)], LEVELS[course_id % len(LEVELS)]
+        courses.append({
+            'id': course_id, 'language': language, 'level': level,
+            'title': f'{language} {level} {course_id}',
+            'description': f'Synthetic {language} course number {course_id}.',
+            'learning_objectives': 'Read simple texts\nHold a basic conversation\nWrite short messages',
+        })
+        for order in range(1, scale['modules_per_course'] + 1):
+            module_id = len(modules) + 1
+            modules.append({'id': module_id, 'course_id': course_id, 'order': order,
+                            'title': f'Module {order}', 'description': f'Module {order} of course {course_id}.'})
+            for number in range(1, scale['lessons_per_module'] + 1):
+                lesson_id = len(lessons) + 1
+                lessons.append({'id': lesson_id, 'module_id': module_id, 'lesson_number': number,
+                                'title': f'Lesson {number}', 'estimated_duration': '20 mins',
+                                'content': f'<p>Content for lesson {lesson_id}. ' + 'Lorem ipsum dolor sit amet. ' * 40 + '</p>'})
+                for q in range(scale['quizzes_per_lesson']):
+                    quizzes.append({'id': len(quizzes) + 1, 'lesson_id': lesson_id,
+                                    'question': f'Question {q + 1} of lesson {lesson_id}?',
+                                    'options': ['Alpha', 'Beta', 'Gamma', 'Delta'], 'correct_answer': 'Beta',
+                                    'quiz_type': 'multiple_choice'})
+    write(models.Course, courses)
+    write(models.Module, modules)
+    write(models.Lesson, lessons)
+    write(models.Quiz, quizzes)
+
+    enrollments, course_ids = [], range(1, scale['courses'] + 1)
+    for user_id in range(1, scale['users'] + 1):
+        for course_id in sorted(rng.sample(course_ids, min(scale['enrollments_per_user'], scale['courses']))):
+            enrollments.append({'user_id': user_id, 'course_id': course_id})
+        if len(enrollments) >= chunk_size:
+            write(models.enrollments, enrollments)
+            enrollments.clear()
+    write(models.enrollments, enrollments)
+
+    attempts = []
+    for attempt_id in range(1, scale['attempts'] + 1):
+        is_correct = rng.random() < 0.7
+        attempts.append({
+            'id': attempt_id, 'user_id': rng.randint(1, scale['users']),
+            'quiz_id': rng.randint(1, len(quizzes)),
+            'selected_answer': 'Beta' if is_correct else rng.choice(('Alpha', 'Gamma', 'Delta')),
+            'is_correct': is_correct,
+            'attempted_at': now - datetime.timedelta(seconds=rng.randint(0, 90 * 86400)),
+        })
+        if len(attempts) >= chunk_size:
+            write(models.QuizAttempt, attempts)
+            attempts.clear()
+    write(models.QuizAttempt, attempts)
+
+    posts, comments = [], []
+    for post_id in range(1, scale['forum_posts'] + 1):
+        created_at = now - datetime.timedelta(seconds=rng.randint(0, 90 * 86400))
+        posts.append({'id': post_id, 'user_id': rng.randint(1, scale['users']),
+                      'language': rng.choice(LANGUAGES), 'topic': rng.choice(('Grammar', 'Vocabulary', 'Culture')),
+                      'title': f'Forum post {post_id}', 'content': 'A synthetic question. ' * 10,
+                      'created_at': created_at, 'comment_count': scale['comments_per_post']})
+        for c in range(scale['comments_per_post']):
+            comments.append({'id': len(comments) + 1, 'post_id': post_id, 'user_id': rng.randint(1, scale['users']),
+                             'content': 'A synthetic reply.', 'created_at': created_at + datetime.timedelta(minutes=c + 1)})
+    write(models.ForumPost, posts)
+    write(models.Comment, comments)
+    db.session.commit()
+    return scale
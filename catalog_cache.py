@@ -0,0 +1,302 @@
+"""In-process cache for the course catalog (Course -> Module -> Lesson -> Quiz).
+
+Catalog content only changes when it is edited, so the read-heavy routes serve
+immutable snapshots from memory instead of querying the hierarchy on every
+request. The cache carries a version number that is bumped whenever a catalog
+row is inserted, updated or deleted through the ORM session; bumping the
+version drops every cached entry. Entries are additionally bounded by an LRU
+limit and a TTL, the latter also covering writes made by other processes.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, select
+
+from quiz_checker import compile_checker
+
+# --- Snapshot types ---
+# Plain tuples keep the snapshots small, immutable and safe to share between
+# threads. Templates use them exactly like the ORM objects they replace.
+QuizSnapshot = namedtuple('QuizSnapshot', [
+    'id', 'lesson_id', 'question', 'options', 'correct_answer', 'quiz_type',
+    'accepted_answers', 'checker',
+])
+LessonSnapshot = namedtuple('LessonSnapshot', [
+    'id', 'module_id', 'lesson_number', 'title', 'content', 'video_url',
+    'estimated_duration', 'quizzes',
+])
+ModuleSnapshot = namedtuple('ModuleSnapshot', [
+    'id', 'course_id', 'title', 'order', 'description', 'lessons', 'quiz_count',
+])
+CourseSummary = namedtuple('CourseSummary', [
+    'id', 'language', 'level', 'title', 'description', 'image_url',
+    'learning_objectives', 'objectives',
+])
+CourseTree = namedtuple('CourseTree', CourseSummary._fields + ('modules', 'quiz_count'))
+LessonContext = namedtuple('LessonContext', ['course', 'module', 'lesson'])
+QuizContext = namedtuple('QuizContext', ['course', 'module', 'lesson', 'quiz'])
+
+# Display order of course levels; unknown levels sort after these, alphabetically
+LEVELS = ('Beginner', 'Intermediate', 'Advanced')
+
+_MISSING = object()
+
+
+class CatalogCache:
+    """Versioned LRU/TTL cache of catalog snapshots.
+
+    Call :meth:`init_app` once the catalog models exist; it reads
+    ``CATALOG_CACHE_MAX_ENTRIES`` and ``CATALOG_CACHE_TTL`` from the app config
+    and hooks the session events that keep the version current.
+    """
+
+    def __init__(self, max_entries=2048, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self.last_modified = time.time()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._models = ()
+
+    def init_app(self, app, db, course_model, module_model, lesson_model, quiz_model):
+        self.max_entries = app.config.setdefault('CATALOG_CACHE_MAX_ENTRIES', self.max_entries)
+        self.ttl = app.config.setdefault('CATALOG_CACHE_TTL', self.ttl)
+        self._db = db
+        self.Course, self.Module, self.Lesson, self.Quiz = self._models = (
+            course_model, module_model, lesson_model, quiz_model)
+        if not event.contains(db.session, 'after_flush', self._after_flush): # Once per process, however many apps
+            event.listen(db.session, 'after_flush', self._after_flush)
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+        app.extensions['catalog_cache'] = self
+
+    # --- Invalidation ---
+    def _after_flush(self, session, flush_context):
+        # Collection-only changes (e.g. a user enrolling in a course) leave the
+        # catalog content untouched and must not invalidate it.
+        dirty = (obj for obj in session.dirty
+                 if session.is_modified(obj, include_collections=False))
+        for obj in (*session.new, *session.deleted, *dirty):
+            if isinstance(obj, self._models):
+                session.info['catalog_dirty'] = True
+                return
+
+    def _after_commit(self, session):
+        if session.info.pop('catalog_dirty', False):
+            self.invalidate()
+
+    def _after_rollback(self, session):
+        session.info.pop('catalog_dirty', None)
+
+    def invalidate(self):
+        """Bump the catalog version and drop every cached snapshot.
+
+        Writes that bypass the ORM unit of work (Core inserts, bulk updates)
+        must call this explicitly once committed.
+        """
+        with self._lock:
+            self.version += 1
+            self.last_modified = time.time()
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    # --- Lookup ---
+    def _entry(self, key):
+        """Return the cached ``[value, expires_at, digest]`` for ``key``, loading it on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            version = self.version
+        entry = [self._load(key), now + self.ttl, None]
+        with self._lock:
+            # A write committed while we were loading makes the value stale.
+            if version == self.version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return entry
+
+    def _get(self, key):
+        value = self._entry(key)[0]
+        return None if value is _MISSING else value
+
+    def _load(self, key):
+        if key == 'courses':
+            return self._load_courses()
+        if key == 'languages':
+            return self._load_languages()
+        kind, entity_id = key
+        if kind == 'course':
+            return self._load_course(entity_id)
+        if kind == 'quiz':
+            return self._load_quiz(entity_id)
+        return self._load_lesson(entity_id)
+
+    def digest(self, key):
+        """Content fingerprint of a cached value, or ``None`` if it does not exist.
+
+        ``key`` is ``'courses'``, ``'languages'``, ``('course', id)``, ``('lesson', id)`` or ``('quiz', id)``.
+        Unlike :attr:`version`, the digest depends only on catalog content, so
+        every process serving the same content produces the same value.
+        """
+        entry = self._entry(key)
+        if entry[0] is _MISSING:
+            return None
+        if entry[2] is None:
+            entry[2] = hashlib.blake2b(repr(entry[0]).encode('utf-8'), digest_size=12).hexdigest()
+        return entry[2]
+
+    def courses(self):
+        """All courses ordered by language and level, without their content."""
+        return self._get('courses')
+
+    def languages(self):
+        """``(language, levels)`` pairs for every language with courses, by language."""
+        return self._get('languages')
+
+    def course(self, course_id):
+        """The full tree for one course, or ``None`` if it does not exist."""
+        return self._get(('course', course_id))
+
+    def lesson(self, lesson_id):
+        """A :class:`LessonContext` for one lesson, or ``None``."""
+        return self._get(('lesson', lesson_id))
+
+    def quiz(self, quiz_id):
+        """A :class:`QuizContext` for one quiz, or ``None``."""
+        return self._get(('quiz', quiz_id))
+
+    # --- Loading ---
+    def _summary_columns(self):
+        Course = self.Course
+        return (Course.id, Course.language, Course.level, Course.title,
+                Course.description, Course.image_url, Course.learning_objectives)
+
+    def _load_courses(self):
+        Course = self.Course
+        rows = self._db.session.execute(
+            select(*self._summary_columns()).order_by(Course.language, Course.level)
+        )
+        return tuple(CourseSummary(*row, objectives=_objectives(row.learning_objectives)) for row in rows)
+
+    def _load_languages(self):
+        Course = self.Course
+        # Answered from the (language, level) index without reading course rows
+        rows = self._db.session.execute(
+            select(Course.language, Course.level).distinct().order_by(Course.language)
+        )
+        levels = {}
+        for language, level in rows:
+            levels.setdefault(language, []).append(level)
+        return tuple((language, tuple(sorted(found, key=_level_order))) for language, found in levels.items())
+
+    def _load_course(self, course_id):
+        Course, Module, Lesson, Quiz = self._models
+        session = self._db.session
+        course_row = session.execute(
+            select(*self._summary_columns()).where(Course.id == course_id)
+        ).first()
+        if course_row is None:
+            return _MISSING
+
+        module_rows = session.execute(
+            select(Module.id, Module.course_id, Module.title, Module.order, Module.description)
+            .where(Module.course_id == course_id)
+            .order_by(Module.order)
+        ).all()
+        module_ids = select(Module.id).where(Module.course_id == course_id).scalar_subquery()
+        lesson_rows = session.execute(
+            select(Lesson.id, Lesson.module_id, Lesson.lesson_number, Lesson.title,
+                   Lesson.content, Lesson.video_url, Lesson.estimated_duration)
+            .where(Lesson.module_id.in_(module_ids))
+            .order_by(Lesson.module_id, Lesson.lesson_number)
+        ).all()
+        lesson_ids = select(Lesson.id).where(Lesson.module_id.in_(module_ids)).scalar_subquery()
+        quiz_rows = session.execute(
+            select(Quiz.id, Quiz.lesson_id, Quiz.question, Quiz.options,
+                   Quiz.correct_answer, Quiz.quiz_type, Quiz.accepted_answers)
+            .where(Quiz.lesson_id.in_(lesson_ids))
+            .order_by(Quiz.lesson_id, Quiz.id) # Index order; quizzes are grouped per lesson below
+        ).all()
+
+        quizzes_by_lesson = {}
+        for row in quiz_rows:
+            # Answer checkers are compiled here, once per quiz and catalog version
+            accepted_answers = tuple(row.accepted_answers or ())
+            quiz = QuizSnapshot(row.id, row.lesson_id, row.question, tuple(row.options or ()),
+                                row.correct_answer, row.quiz_type, accepted_answers,
+                                compile_checker(row.quiz_type, row.correct_answer, accepted_answers))
+            quizzes_by_lesson.setdefault(row.lesson_id, []).append(quiz)
+        lessons_by_module = {}
+        for row in lesson_rows:
+            lesson = LessonSnapshot(*row, quizzes=tuple(quizzes_by_lesson.get(row.id, ())))
+            lessons_by_module.setdefault(row.module_id, []).append(lesson)
+        modules = []
+        for row in module_rows:
+            lessons = tuple(lessons_by_module.get(row.id, ()))
+            quiz_count = sum(len(lesson.quizzes) for lesson in lessons)
+            modules.append(ModuleSnapshot(*row, lessons=lessons, quiz_count=quiz_count))
+        return CourseTree(*course_row, objectives=_objectives(course_row.learning_objectives),
+                          modules=tuple(modules), quiz_count=len(quiz_rows))
+
+    def _load_lesson(self, lesson_id):
+        Module, Lesson = self.Module, self.Lesson
+        row = self._db.session.execute(
+            select(Module.course_id, Lesson.module_id)
+            .join(Lesson, Lesson.module_id == Module.id)
+            .where(Lesson.id == lesson_id)
+        ).first()
+        course = self.course(row.course_id) if row is not None else None
+        if course is None:
+            return _MISSING
+        for module in course.modules:
+            if module.id != row.module_id:
+                continue
+            for lesson in module.lessons:
+                if lesson.id == lesson_id:
+                    return LessonContext(course, module, lesson)
+        return _MISSING
+
+    def _load_quiz(self, quiz_id):
+        lesson_id = self._db.session.execute(
+            select(self.Quiz.lesson_id).where(self.Quiz.id == quiz_id)
+        ).scalar()
+        context = self.lesson(lesson_id) if lesson_id is not None else None
+        if context is None:
+            return _MISSING
+        for quiz in context.lesson.quizzes:
+            if quiz.id == quiz_id:
+                return QuizContext(context.course, context.module, context.lesson, quiz)
+        return _MISSING
+
+
+def _level_order(level):
+    return (LEVELS.index(level), '') if level in LEVELS else (len(LEVELS), level)
+
+
+def _objectives(text):
+    # Learning objectives are stored one per line; split them once at load time
+    return tuple(line.strip() for line in (text or '').split('\n') if line.strip())
@@ -0,0 +1,209 @@
+"""Bulk, idempotent import of course trees from JSON, JSON Lines or YAML files.
+
+Each course is a nested document::
+
+    {"language": "Spanish", "level": "Beginner", "title": "...", ...,
+     "modules": [{"order": 1, "title": "...",
+                  "lessons": [{"lesson_number": 1, "title": "...", "content": "...",
+                               "quizzes": [{"question": "...", "options": ["...", "..."],
+                                            "correct_answer": "...", "accepted_answers": ["..."],
+                                            "quiz_type": "..."}]}]}]}
+
+Rows are matched on natural keys - (language, level, title) for courses,
+``order`` within a course, ``lesson_number`` within a module and ``question``
+within a lesson - so re-importing a file updates content in place instead of
+duplicating it. Quiz ``options`` and ``accepted_answers`` are lists; legacy
+comma-joined strings are split on import. Every table level is written with one executemany INSERT and
+one bulk UPDATE per course, with parent ids resolved client-side from a single
+SELECT per level.
+"""
+import json
+import os
+import time
+
+from sqlalchemy import insert, select, update
+
+from quiz_checker import parse_choices
+
+COURSE_FIELDS = ('language', 'level', 'title', 'description', 'image_url', 'learning_objectives')
+MODULE_FIELDS = ('order', 'title', 'description')
+LESSON_FIELDS = ('lesson_number', 'title', 'content', 'video_url', 'estimated_duration')
+QUIZ_FIELDS = ('question', 'options', 'correct_answer', 'accepted_answers', 'quiz_type')
+DEFAULTS = {'quiz_type': 'multiple_choice'}
+CONVERTERS = {'options': parse_choices, 'accepted_answers': parse_choices}
+
+
+def load_catalog_file(path):
+    """Yield course documents from ``path``.
+
+    ``.jsonl``/``.ndjson`` files hold one course per line and are streamed;
+    ``.yaml``/``.yml`` files may hold several documents. A JSON or YAML
+    document may be a single course, a list of courses or ``{"courses": [...]}``.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8') as handle:
+        if extension in ('.jsonl', '.ndjson'):
+            for line in handle:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        if extension in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError('PyYAML is required to import YAML catalog files') from None
+            documents = yaml.safe_load_all(handle)
+        else:
+            documents = [json.load(handle)]
+        for document in documents:
+            if isinstance(document, dict) and 'courses' in document:
+                document = document['courses']
+            if isinstance(document, dict):
+                document = [document]
+            yield from document or ()
+
+
+class ImportStats:
+    """Row counters for one import run."""
+
+    def __init__(self):
+        self.courses = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.started = time.perf_counter()
+
+    @property
+    def rows(self):
+        return self.inserted + self.updated + self.unchanged
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f'{self.courses} courses, {self.inserted} rows inserted, {self.updated} updated, '
+                f'{self.unchanged} unchanged in {self.elapsed:.2f}s ({self.rows_per_second:.0f} rows/sec)')
+
+
+class CatalogImporter:
+    """Upsert course trees into the Course/Module/Lesson/Quiz tables.
+
+    Writes go through Core/ORM bulk statements and bypass the session's unit of
+    work, so callers must invalidate any catalog caches after :meth:`run`.
+    """
+
+    def __init__(self, db, course_model, module_model, lesson_model, quiz_model):
+        self.db = db
+        self.Course, self.Module, self.Lesson, self.Quiz = course_model, module_model, lesson_model, quiz_model
+
+    def run(self, courses, commit_every=1):
+        """Import ``courses`` and return :class:`ImportStats`.
+
+        A transaction is committed once at least ``commit_every`` rows have
+        been written since the last commit, and always at a course boundary;
+        the default commits after each course.
+        """
+        stats = ImportStats()
+        rows_since_commit = 0
+        for course in courses:
+            before = stats.rows
+            self._import_course(course, stats)
+            stats.courses += 1
+            rows_since_commit += stats.rows - before
+            if rows_since_commit >= commit_every:
+                self.db.session.commit()
+                rows_since_commit = 0
+        self.db.session.commit()
+        return stats
+
+    def _import_course(self, document, stats):
+        Course, Module, Lesson, Quiz = self.Course, self.Module, self.Lesson, self.Quiz
+        session = self.db.session
+
+        course_values = _pick(document, COURSE_FIELDS)
+        existing = session.execute(
+            select(Course.id, *_columns(Course, COURSE_FIELDS)).where(
+                Course.language == course_values['language'],
+                Course.level == course_values['level'],
+                Course.title == course_values['title'],
+            )
+        ).first()
+        if existing is None:
+            course_id = session.execute(insert(Course).values(**course_values)).inserted_primary_key[0]
+            stats.inserted += 1
+        else:
+            course_id = existing.id
+            self._write(Course, [], [(existing, course_values)], stats)
+
+        modules = document.get('modules') or []
+        module_ids = self._upsert_level(
+            Module, MODULE_FIELDS, 'course_id', {course_id: modules}, 'order', stats)
+
+        lessons_by_module = {module_ids[(course_id, m['order'])]: m.get('lessons') or [] for m in modules}
+        lesson_ids = self._upsert_level(
+            Lesson, LESSON_FIELDS, 'module_id', lessons_by_module, 'lesson_number', stats)
+
+        quizzes_by_lesson = {}
+        for module_id, lessons in lessons_by_module.items():
+            for lesson in lessons:
+                quizzes_by_lesson[lesson_ids[(module_id, lesson['lesson_number'])]] = lesson.get('quizzes') or []
+        self._upsert_level(Quiz, QUIZ_FIELDS, 'lesson_id', quizzes_by_lesson, 'question', stats)
+
+    def _upsert_level(self, model, fields, parent_field, children_by_parent, key_field, stats):
+        """Upsert one level of the tree; return ``{(parent_id, key): id}``."""
+        if not children_by_parent:
+            return {}
+        parent_column = getattr(model, parent_field)
+        select_existing = select(model.id, parent_column, *_columns(model, fields)).where(
+            parent_column.in_(list(children_by_parent)))
+        existing = {(row[1], getattr(row, key_field)): row for row in self.db.session.execute(select_existing)}
+
+        inserts, updates = [], []
+        for parent_id, children in children_by_parent.items():
+            for child in children:
+                values = _pick(child, fields)
+                row = existing.get((parent_id, values[key_field]))
+                if row is None:
+                    inserts.append({parent_field: parent_id, **values})
+                else:
+                    updates.append((row, values))
+        self._write(model, inserts, updates, stats)
+
+        if not inserts:
+            return {key: row.id for key, row in existing.items()}
+        return {
+            (row[1], row[2]): row.id
+            for row in self.db.session.execute(
+                select(model.id, parent_column, getattr(model, key_field)).where(
+                    parent_column.in_(list(children_by_parent))))
+        }
+
+    def _write(self, model, inserts, updates, stats):
+        changed = [
+            {'id': row.id, **values} for row, values in updates
+            if any(getattr(row, field) != value for field, value in values.items())
+        ]
+        if inserts:
+            self.db.session.execute(insert(model), inserts)
+        if changed:
+            self.db.session.execute(update(model), changed)
+        stats.inserted += len(inserts)
+        stats.updated += len(changed)
+        stats.unchanged += len(updates) - len(changed)
+
+
+def _pick(document, fields):
+    # Every row carries every field so executemany batches share one statement
+    values = {field: document.get(field, DEFAULTS.get(field)) for field in fields}
+    for field in CONVERTERS.keys() & values.keys():
+        values[field] = CONVERTERS[field](values[field])
+    return values
+
+
+def _columns(model, fields):
+    return [getattr(model, field) for field in fields]
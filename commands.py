@@ -0,0 +1,339 @@
+"""Flask CLI commands, registered at the top level by the ``commands`` blueprint.
+
+:mod:`reports` (which loads numpy and pyarrow when installed) is imported by
+the report commands themselves, so web workers never pay for it.
+"""
+import datetime
+import functools
+import os
+
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import delete, insert, select
+
+from catalog_import import CatalogImporter, load_catalog_file
+from extensions import catalog, db, review_scheduler, search_index, task_queue
+from models import Course, Lesson, Module, Quiz, QuizAttempt, QuizAttemptDaily, UserProgress
+from services import PROGRESS_SCOPES, enroll_users, resolve_user_ids
+import migrations
+
+bp = Blueprint('commands', __name__, cli_group=None)
+
+# --- Spaced Repetition ---
+@bp.cli.group('review')
+def review_cli():
+    """Spaced-repetition review schedules."""
+
+@review_cli.command('rebuild')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: REVIEW_REBUILD_WORKERS).')
+def review_rebuild_command(workers):
+    """Recompute every review schedule from the full quiz attempt history."""
+    users, states = review_scheduler.rebuild(workers)
+    click.echo(f'Rebuilt {states} review schedules for {users} users.')
+
+# --- Search ---
+@bp.cli.command('search-rebuild')
+def search_rebuild_command():
+    """Reindex every course, lesson and forum post for search."""
+    click.echo(f'Indexed {search_index.rebuild()} documents.')
+
+# --- Progress Aggregates ---
+@bp.cli.command('rebuild-progress')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows fetched and written per round-trip.')
+def rebuild_progress_command(batch_size):
+    """Recompute all UserProgress aggregates from raw quiz attempts."""
+    attempts = db.session.execute(
+        select(QuizAttempt.user_id, QuizAttempt.quiz_id, QuizAttempt.is_correct,
+                  QuizAttempt.attempted_at, Quiz.lesson_id, Lesson.module_id, Module.course_id)
+        .join(Quiz, QuizAttempt.quiz_id == Quiz.id)
+        .join(Lesson, Quiz.lesson_id == Lesson.id)
+        .join(Module, Lesson.module_id == Module.id)
+        .order_by(QuizAttempt.user_id, QuizAttempt.attempted_at)
+        .execution_options(yield_per=batch_size)
+    )
+    db.session.execute(delete(UserProgress))
+
+    pending = []
+    def flush_user(user_id, aggregates):
+        for (scope, scope_id), values in aggregates.items():
+            pending.append({'user_id': user_id, 'scope': scope, 'scope_id': scope_id, **values})
+        if len(pending) >= batch_size:
+            db.session.execute(insert(UserProgress), pending)
+            pending.clear()
+
+    # Attempts arrive grouped by user, so only one user's aggregates are held at a time
+    current_user_id, aggregates, solved, total = None, {}, set(), 0
+    for row in attempts:
+        if row.user_id != current_user_id:
+            if current_user_id is not None:
+                flush_user(current_user_id, aggregates)
+            current_user_id, aggregates, solved = row.user_id, {}, set()
+        newly_solved = row.is_correct and row.quiz_id not in solved
+        if newly_solved:
+            solved.add(row.quiz_id)
+        for scope, scope_id in zip(PROGRESS_SCOPES, (row.quiz_id, row.lesson_id, row.module_id, row.course_id)):
+            values = aggregates.setdefault((scope, scope_id), {
+                'attempts': 0, 'correct_answers': 0, 'quizzes_solved': 0, 'last_activity_at': None})
+            values['attempts'] += 1
+            values['correct_answers'] += int(row.is_correct)
+            values['quizzes_solved'] += int(newly_solved)
+            values['last_activity_at'] = row.attempted_at # Ordered by attempted_at within a user
+        total += 1
+    if current_user_id is not None:
+        flush_user(current_user_id, aggregates)
+    if pending:
+        db.session.execute(insert(UserProgress), pending)
+    db.session.commit()
+    click.echo(f'Rebuilt progress aggregates from {total} quiz attempts.')
+
+# --- Reports ---
+REPORT_BATCH_SIZE = 10000
+
+def report_quizzes():
+    """Quiz metadata for the reports, with the course each quiz belongs to."""
+    from reports import QuizInfo
+    rows = db.session.execute(
+        select(Quiz.id, Module.course_id, Quiz.question, Quiz.options, Quiz.correct_answer)
+        .join(Lesson, Quiz.lesson_id == Lesson.id)
+        .join(Module, Lesson.module_id == Module.id)
+    )
+    return [QuizInfo(quiz_id, course_id, question, options or [], correct)
+            for quiz_id, course_id, question, options, correct in rows]
+
+def report_learners(quizzes, pass_threshold, batch_size=REPORT_BATCH_SIZE):
+    """Count learners per course, and those who solved ``pass_threshold`` of its quizzes."""
+    from reports import stream_batches
+    quiz_counts = {}
+    for quiz in quizzes:
+        quiz_counts[quiz.course_id] = quiz_counts.get(quiz.course_id, 0) + 1
+    learners, passed = {}, {}
+    statement = select(UserProgress.scope_id, UserProgress.quizzes_solved).where(UserProgress.scope == 'course')
+    for batch in stream_batches(db.session, statement, batch_size):
+        for course_id, quizzes_solved in batch:
+            learners[course_id] = learners.get(course_id, 0) + 1
+            if quiz_counts.get(course_id) and quizzes_solved / quiz_counts[course_id] >= pass_threshold:
+                passed[course_id] = passed.get(course_id, 0) + 1
+    return learners, passed
+
+def refresh_daily_rollup(since=None):
+    """Recompute QuizAttemptDaily from ``since`` (a date) onwards; returns the rows written.
+
+    Without ``since`` the latest materialized day is recomputed (it may have
+    been partial) along with everything after it.
+    """
+    if since is None:
+        since = db.session.execute(select(db.func.max(QuizAttemptDaily.day))).scalar()
+    day = db.func.date(QuizAttempt.attempted_at)
+    aggregate = select(
+        day, QuizAttempt.quiz_id, db.func.count(),
+        db.func.sum(db.case((QuizAttempt.is_correct, 1), else_=0)),
+    ).group_by(day, QuizAttempt.quiz_id)
+    clear = delete(QuizAttemptDaily)
+    if since is not None:
+        aggregate = aggregate.where(QuizAttempt.attempted_at >= datetime.datetime.combine(since, datetime.time()))
+        clear = clear.where(QuizAttemptDaily.day >= since)
+    db.session.execute(clear)
+    written = db.session.execute(insert(QuizAttemptDaily).from_select(
+        ['day', 'quiz_id', 'attempts', 'correct'], aggregate)).rowcount
+    db.session.commit()
+    return written
+
+@bp.cli.group('report')
+def report_cli():
+    """Quiz attempt reports for instructors."""
+
+@report_cli.command('summary')
+@click.argument('output_dir', type=click.Path(file_okay=False))
+@click.option('--format', 'output_format', type=click.Choice(['csv', 'parquet']), default='csv', show_default=True)
+@click.option('--pass-threshold', default=0.7, show_default=True,
+              help="Share of a course's quizzes a learner must have solved to pass.")
+@click.option('--batch-size', default=REPORT_BATCH_SIZE, show_default=True, help='Attempts fetched per round-trip.')
+def report_summary_command(output_dir, output_format, pass_threshold, batch_size):
+    """Write quiz difficulty, answer distribution and course pass-rate reports."""
+    from reports import (ANSWER_DISTRIBUTION_COLUMNS, COURSE_PASS_RATE_COLUMNS, QUIZ_DIFFICULTY_COLUMNS,
+                         AttemptAggregator, course_pass_rates, stream_batches, write_report)
+    quizzes = report_quizzes()
+    aggregator = AttemptAggregator(quizzes)
+    statement = select(QuizAttempt.quiz_id, QuizAttempt.selected_answer, QuizAttempt.is_correct)
+    for batch in stream_batches(db.session, statement, batch_size):
+        aggregator.add(batch)
+    learners, passed = report_learners(quizzes, pass_threshold, batch_size)
+    courses = dict(db.session.execute(select(Course.id, Course.title)).all())
+
+    os.makedirs(output_dir, exist_ok=True)
+    reports = [
+        ('quiz_difficulty', QUIZ_DIFFICULTY_COLUMNS, aggregator.quiz_difficulty()),
+        ('answer_distribution', ANSWER_DISTRIBUTION_COLUMNS, aggregator.answer_distribution()),
+        ('course_pass_rates', COURSE_PASS_RATE_COLUMNS,
+         course_pass_rates(courses, aggregator.course_totals(), learners, passed)),
+    ]
+    try:
+        for name, columns, rows in reports:
+            path = os.path.join(output_dir, f'{name}.{output_format}')
+            count = write_report(path, columns, rows, output_format)
+            click.echo(f'{path}: {count} rows')
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Aggregated {aggregator.total} quiz attempts.')
+
+@report_cli.command('attempts')
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', 'output_format', type=click.Choice(['csv', 'parquet']),
+              help='Defaults to the output file extension (CSV for -).')
+@click.option('--since', type=click.DateTime(), help='Only attempts at or after this time.')
+@click.option('--until', type=click.DateTime(), help='Only attempts before this time.')
+@click.option('--course-id', type=int, help='Only attempts on this course.')
+@click.option('--batch-size', default=REPORT_BATCH_SIZE, show_default=True, help='Rows fetched and written at a time.')
+def report_attempts_command(output, output_format, since, until, course_id, batch_size):
+    """Export raw quiz attempts with their lesson, module and course ids."""
+    from reports import ATTEMPT_EXPORT_COLUMNS, open_report, stream_batches
+    statement = (
+        select(QuizAttempt.id, QuizAttempt.user_id, QuizAttempt.quiz_id, Quiz.lesson_id, Lesson.module_id,
+               Module.course_id, QuizAttempt.selected_answer, QuizAttempt.is_correct, QuizAttempt.attempted_at)
+        .join(Quiz, QuizAttempt.quiz_id == Quiz.id)
+        .join(Lesson, Quiz.lesson_id == Lesson.id)
+        .join(Module, Lesson.module_id == Module.id)
+        .order_by(QuizAttempt.id)
+    )
+    if since:
+        statement = statement.where(QuizAttempt.attempted_at >= since)
+    if until:
+        statement = statement.where(QuizAttempt.attempted_at < until)
+    if course_id is not None:
+        statement = statement.where(Module.course_id == course_id)
+    try:
+        writer = open_report(output, ATTEMPT_EXPORT_COLUMNS, output_format)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    total = 0
+    try:
+        for batch in stream_batches(db.session, statement, batch_size):
+            writer.write(batch)
+            total += len(batch)
+    finally:
+        writer.close()
+    click.echo(f'Exported {total} quiz attempts.', err=True)
+
+@report_cli.command('rollup')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Recompute from this day on (default: the latest materialized day).')
+@click.option('--full', is_flag=True, help='Recompute every day.')
+def report_rollup_command(since, full):
+    """Refresh the materialized daily attempt counts."""
+    if full:
+        db.session.execute(delete(QuizAttemptDaily))
+    written = refresh_daily_rollup(since.date() if since else None)
+    click.echo(f'Wrote {written} daily rollup rows.')
+
+# --- Enrollment ---
+@bp.cli.command('enroll-cohort')
+@click.argument('course_ids', nargs=-1, required=True, type=int)
+@click.option('--users-file', required=True, type=click.File(encoding='utf-8'),
+              help='File with one user id or email per line (- for stdin).')
+def enroll_cohort_command(course_ids, users_file):
+    """Enroll every listed user in the given courses."""
+    identifiers = [line.strip() for line in users_file if line.strip()]
+    missing_courses = set(course_ids) - set(db.session.execute(select(Course.id).where(Course.id.in_(course_ids))).scalars())
+    if missing_courses:
+        raise click.BadParameter(f'unknown course ids: {sorted(missing_courses)}', param_hint='COURSE_IDS')
+    user_ids = resolve_user_ids(identifiers)
+    enrolled = enroll_users(user_ids, course_ids)
+    click.echo(f'{len(user_ids)} of {len(identifiers)} users found; {enrolled} new enrollments created.')
+
+# --- Catalog ---
+INITIAL_CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'initial_catalog.json')
+
+catalog_importer = CatalogImporter(db, Course, Module, Lesson, Quiz)
+
+def create_initial_data(path=INITIAL_CATALOG_PATH):
+    """Import the starter catalog into a database without courses; returns the stats, or None if skipped."""
+    if Course.query.first() is not None:
+        return None
+    stats = catalog_importer.run(load_catalog_file(path))
+    catalog.invalidate()
+    search_index.rebuild()
+    return stats
+
+@bp.cli.command('seed')
+@click.option('--catalog', 'path', default=INITIAL_CATALOG_PATH, show_default=True,
+              type=click.Path(exists=True, dir_okay=False), help='Catalog file to load.')
+def seed_command(path):
+    """Load the starter course catalog into an empty database (once, after db-upgrade)."""
+    current, head = migrations.status(db.engine)
+    if current != head:
+        raise click.ClickException(f'The database schema is not at version {head}; run `flask db-upgrade` first.')
+    stats = create_initial_data(path)
+    if stats is None:
+        click.echo('Database already contains courses; nothing seeded.')
+    else:
+        click.echo(f'Seeded the initial catalog: {stats}.')
+
+@bp.cli.command('import-catalog')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--commit-every', default=1, show_default=True,
+              help='Commit once this many rows have been written (always at a course boundary).')
+def import_catalog_command(paths, commit_every):
+    """Import or update course trees from JSON, JSON Lines or YAML files."""
+    for path in paths:
+        try:
+            stats = catalog_importer.run(load_catalog_file(path), commit_every=commit_every)
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            catalog.invalidate()
+        click.echo(f'{path}: {stats}')
+    # The importer writes in bulk, bypassing the session hooks that index incrementally
+    click.echo(f'Reindexed {search_index.rebuild()} search documents.')
+
+# --- Background Tasks ---
+@bp.cli.group('tasks')
+def tasks_cli():
+    """Background task queue."""
+
+@tasks_cli.command('work')
+@click.option('--workers', type=int, default=None, help='Worker processes (default: TASK_WORKERS; 0 runs tasks here).')
+@click.option('--burst', is_flag=True, help='Exit once no task is due instead of waiting for more.')
+def tasks_work_command(workers, burst):
+    """Run queued tasks until interrupted; Ctrl-C or SIGTERM lets running tasks finish."""
+    from app import create_app
+    app_factory = functools.partial(create_app, {
+        'SQLALCHEMY_DATABASE_URI': current_app.config['SQLALCHEMY_DATABASE_URI'],
+        'SCHEMA_CHECK_ON_STARTUP': False,
+    })
+    outcomes = task_queue.work(app_factory, workers, burst=burst)
+    click.echo(f'{outcomes["done"]} tasks done, {outcomes["retried"]} to be retried, {outcomes["failed"]} failed.')
+
+@tasks_cli.command('status')
+def tasks_status_command():
+    """Count stored tasks by type and status."""
+    counts = task_queue.counts()
+    if not counts:
+        click.echo('No tasks.')
+    for (name, status), count in sorted(counts.items()):
+        click.echo(f'{name:<24} {status:<8} {count:>8}')
+
+@tasks_cli.command('retry')
+@click.option('--name', help='Only tasks of this type.')
+def tasks_retry_command(name):
+    """Queue failed tasks again with a fresh set of attempts."""
+    click.echo(f'Requeued {task_queue.retry_failed(name)} failed tasks.')
+
+@tasks_cli.command('purge')
+@click.option('--days', default=30, show_default=True, help='Keep tasks that finished within this many days.')
+def tasks_purge_command(days):
+    """Delete finished tasks; their idempotency keys can then be used again."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    click.echo(f'Deleted {task_queue.purge(cutoff)} finished tasks.')
+
+# --- Schema ---
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Create missing tables, apply pending schema migrations and create the search index."""
+    applied = migrations.upgrade(db.engine, db.metadata)
+    for step in applied:
+        click.echo(f'Applied migration {step.version}: {step.description}')
+    click.echo(f'Schema is at version {migrations.head()}.')
+    indexed = search_index.create()
+    if indexed is not None:
+        click.echo(f'Created the search index with {indexed} documents.')
@@ -0,0 +1,116 @@
+"""Engine settings per database backend, and read-replica routing.
+
+:func:`engine_options` turns the app config into ``create_engine`` options for
+a server database (PostgreSQL, MySQL): pool size and overflow, checkout
+timeout, connection recycling and pre-ping health checks.
+
+:func:`configure_sqlite` tunes SQLite connections with PRAGMAs as they are
+opened: WAL journaling so readers never block the writer (or vice versa),
+``synchronous=NORMAL`` (still crash-safe in WAL mode; a power loss can only
+drop the last commits), a busy timeout so concurrent writers wait for the
+lock instead of failing with "database is locked", and larger mmap and page
+caches.
+
+:class:`RoutingSession` sends the SELECTs of views marked with
+:func:`read_only` to the ``replica`` bind when one is configured. Writes,
+locking reads, textual SQL and every other view use the primary.
+
+:func:`dispose_on_fork` makes an app built before ``fork()`` (e.g. gunicorn
+``--preload``) safe to share: no worker inherits a pooled connection.
+"""
+import os
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+SQLITE_JOURNAL_MODES = ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'OFF')
+SQLITE_SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def engine_options(url, config):
+    """``create_engine`` options for ``url`` from the ``DB_POOL_*`` config keys."""
+    if make_url(url).get_backend_name() == 'sqlite':
+        # SQLite is tuned per connection by configure_sqlite()
+        return {}
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def sqlite_pragmas(config):
+    journal_mode = config['SQLITE_JOURNAL_MODE'].upper()
+    synchronous = config['SQLITE_SYNCHRONOUS'].upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f'SQLITE_JOURNAL_MODE must be one of {", ".join(SQLITE_JOURNAL_MODES)}')
+    if synchronous not in SQLITE_SYNCHRONOUS:
+        raise ValueError(f'SQLITE_SYNCHRONOUS must be one of {", ".join(SQLITE_SYNCHRONOUS)}')
+    return (
+        f'PRAGMA busy_timeout = {int(config["SQLITE_BUSY_TIMEOUT_MS"])}', # First, so the others wait too
+        f'PRAGMA journal_mode = {journal_mode}',
+        f'PRAGMA synchronous = {synchronous}',
+        f'PRAGMA mmap_size = {int(config["SQLITE_MMAP_SIZE"])}',
+        f'PRAGMA cache_size = {int(config["SQLITE_CACHE_SIZE"])}',
+    )
+
+
+def configure_sqlite(engine, config):
+    """Apply the ``SQLITE_*`` PRAGMAs to every new connection of a SQLite ``engine``."""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+
+def dispose_on_fork(engines):
+    """Keep pooled connections from crossing a ``fork()`` of a preloaded app.
+
+    Closes what the parent has pooled so far, and gives every forked child
+    fresh pools that never touch connections the parent may still open.
+    """
+    engines = tuple(engines)
+    for engine in engines:
+        engine.dispose()
+
+    def reset_pools():
+        for engine in engines:
+            engine.dispose(close=False) # The parent's connections are its own to close
+
+    os.register_at_fork(after_in_child=reset_pools)
+
+
+def read_only(view):
+    """Let the view's queries read from the replica, if one is configured."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.use_read_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica bind inside :func:`read_only` views."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing
+                and getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+                and has_app_context() and g.get('use_read_replica')):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
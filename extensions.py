@@ -0,0 +1,47 @@
+"""Extension instances shared by the models, views and commands.
+
+Nothing here is bound to an application: :func:`app.create_app` calls each
+``init_app`` once the config is loaded, so importing a model or a view never
+builds an app, opens a connection or starts a thread.
+"""
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+
+from batch_writer import BatchWriter
+from catalog_cache import CatalogCache
+from database_profile import RoutingSession
+from fragment_cache import FragmentCache
+from http_caching import Compressor
+from identity_cache import IdentityCache
+from instrumentation import RequestMetrics
+from password_hashing import PasswordHasher
+from search_index import SearchIndex
+from spaced_repetition import ReviewScheduler
+from task_queue import TaskQueue
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+login_manager = LoginManager()
+login_manager.login_view = 'auth.login'
+login_manager.login_message_category = 'info'
+compressor = Compressor()
+password_hasher = PasswordHasher()
+request_metrics = RequestMetrics()
+
+# Flask-Login gets a slim cached Principal; routes that change a user load the
+# ORM row themselves and invalidate the cached identity after committing.
+identity_cache = IdentityCache()
+
+# Serves the Course -> Module -> Lesson -> Quiz tree from memory; any committed
+# change to those models bumps the catalog version and drops cached snapshots.
+catalog = CatalogCache()
+
+# Rendered course cards, module accordions and lesson bodies, keyed by entity
+# id and the catalog version so catalog edits retire them automatically
+fragment_cache = FragmentCache()
+
+search_index = SearchIndex()
+review_scheduler = ReviewScheduler()
+attempt_writer = BatchWriter()
+
+# Slow side effects (email) run by `flask tasks work`; task types live in tasks.py
+task_queue = TaskQueue()
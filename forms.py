@@ -0,0 +1,57 @@
+from flask_wtf import FlaskForm
+from wtforms import StringField, PasswordField, SubmitField, SelectField, TextAreaField
+from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional, Regexp, ValidationError
+
+from models import User
+
+class RegistrationForm(FlaskForm):
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
+    confirm_password = PasswordField('Confirm Password', validators=[DataRequired(), EqualTo('password')])
+    submit = SubmitField('Register')
+
+    def validate_email(self, email):
+        user = User.query.filter_by(email=email.data).first()
+        if user:
+            raise ValidationError('That email is already taken. Please choose a different one.')
+
+class LoginForm(FlaskForm):
+    email = StringField('Email', validators=[DataRequired(), Email()])
+    password = PasswordField('Password', validators=[DataRequired()])
+    submit = SubmitField('Login')
+
+LANGUAGE_CHOICES = [
+    ('Spanish', 'Spanish'),
+    ('French', 'French'),
+    ('German', 'German'),
+    ('Italian', 'Italian'),
+    ('Japanese', 'Japanese'),
+    # Add more languages as needed
+]
+FORUM_TOPICS = ['Grammar', 'Vocabulary', 'Culture', 'Pronunciation', 'General']
+
+class ProfileUpdateForm(FlaskForm):
+    chosen_language = SelectField('Preferred Language', choices=[('', 'Select a language...')] + LANGUAGE_CHOICES,
+                                  validators=[Optional()])
+    submit = SubmitField('Update Profile')
+
+class ForumPostForm(FlaskForm):
+    title = StringField('Title', validators=[DataRequired(), Length(max=150)])
+    language = SelectField('Language', choices=[('', 'General')] + LANGUAGE_CHOICES, validators=[Optional()])
+    topic = SelectField('Topic', choices=[(t, t) for t in FORUM_TOPICS], validators=[DataRequired()])
+    content = TextAreaField('Content', validators=[DataRequired(), Length(max=10000)])
+    submit = SubmitField('Post')
+
+class CommentForm(FlaskForm):
+    content = TextAreaField('Reply', validators=[DataRequired(), Length(max=5000)])
+    submit = SubmitField('Reply')
+
+# Values that end up in mail headers, which cannot contain line breaks
+SINGLE_LINE = Regexp(r'^[^\r\n]*$', message='Line breaks are not allowed here.')
+
+class ContactForm(FlaskForm):
+    name = StringField('Your Name', validators=[DataRequired(), Length(max=100), SINGLE_LINE])
+    email = StringField('Your Email', validators=[DataRequired(), Email(), Length(max=120)])
+    subject = StringField('Subject', validators=[DataRequired(), Length(max=150), SINGLE_LINE])
+    message = TextAreaField('Message', validators=[DataRequired(), Length(max=5000)])
+    submit = SubmitField('Send Message')
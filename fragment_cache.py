@@ -0,0 +1,113 @@
+"""Rendered-fragment cache for user-independent parts of Jinja templates.
+
+Templates mark a fragment with the ``cache`` tag and an entity key::
+
+    {% cache 'course-card', course.id, courses_digest %} ... {% endcache %}
+
+The rendered markup is stored under that key, whose last part is the content
+digest of the catalog entry the fragment renders: a change made anywhere,
+including by another process, gets a new key once the catalog entry reloads.
+The cache is also cleared whenever the local catalog version changes, so
+edits made by this process retire fragments at once. Storage is an LRU
+bounded by the approximate memory of the cached strings.
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render', [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render(self, key_parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None or not cache.enabled:
+            return caller()
+        return cache.get_or_render(tuple(key_parts), caller)
+
+
+class FragmentCache:
+    """Memory-bounded LRU of rendered fragments tagged with a content version.
+
+    ``FRAGMENT_CACHE_ENABLED`` switches caching on or off; when unset it is on
+    unless the app runs in debug mode, so template edits show up immediately
+    during development.
+    """
+
+    def __init__(self, version=None, max_bytes=32 * 1024 * 1024):
+        self.version = version or (lambda: 0)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        self._entries = OrderedDict()
+        self._entries_version = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, version):
+        self.version = version
+        self.max_bytes = app.config.setdefault('FRAGMENT_CACHE_MAX_BYTES', self.max_bytes)
+        app.config.setdefault('FRAGMENT_CACHE_ENABLED', None)
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.fragment_cache = self
+        app.extensions['fragment_cache'] = self
+
+    @property
+    def enabled(self):
+        enabled = current_app.config['FRAGMENT_CACHE_ENABLED']
+        return not current_app.debug if enabled is None else enabled
+
+    def get_or_render(self, key, render):
+        version = self.version()
+        with self._lock:
+            if self._entries_version != version:
+                self._clear()
+                self._entries_version = version
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        value = render()
+        size = sys.getsizeof(value)
+        with self._lock:
+            if self._entries_version == version and size <= self.max_bytes and key not in self._entries:
+                self._entries[key] = value
+                self._size += size
+                while self._size > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._size -= sys.getsizeof(evicted)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
@@ -0,0 +1,120 @@
+"""HTTP conditional requests and response compression.
+
+:func:`conditional` computes a view's ETag from cheap inputs (catalog content
+digests, the user id) *before* running the view, so a matching
+``If-None-Match`` is answered with ``304 Not Modified`` without querying or
+rendering anything. ETags are weak because :class:`Compressor` may serve the
+same representation gzip- or brotli-encoded.
+"""
+import glob
+import gzip
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+try:
+    import brotli
+except ImportError: # Optional dependency; gzip is always available
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+    'application/json', 'application/x-ndjson', 'image/svg+xml',
+)
+
+
+def release_fingerprint(root_path):
+    """Fingerprint the code and templates that shape responses.
+
+    Mixed into every ETag so a deploy changing templates or views never
+    answers 304 for a page rendered by the previous release. Derived from file
+    metadata, so every worker of a release computes the same value.
+    """
+    digest = hashlib.blake2b(digest_size=6)
+    paths = glob.glob(os.path.join(root_path, '*.py')) + glob.glob(os.path.join(root_path, '*', '*.py')) + glob.glob(
+        os.path.join(root_path, 'templates', '**', '*.html'), recursive=True)
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(f'{os.path.relpath(path, root_path)}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()
+
+
+def conditional(etag, cache_control='private, no-cache', last_modified=None):
+    """Serve 304s for unchanged representations of a GET view.
+
+    ``etag(**view_args)`` returns the parts an ETag is built from, or ``None``
+    to skip conditional handling (e.g. for a missing entity, so the view can
+    404). ``last_modified()`` optionally returns a datetime or timestamp for
+    the ``Last-Modified`` header.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # Pages showing pending flash messages must be rendered; public
+            # responses never show them and must not touch (and Vary on) the session
+            flashes_pending = cache_control.startswith('private') and '_flashes' in session
+            parts = None if flashes_pending else etag(**kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+            tag = hashlib.blake2b(
+                repr((current_app.config['ETAG_SALT'], request.path, parts)).encode('utf-8'),
+                digest_size=12,
+            ).hexdigest()
+            modified = last_modified() if last_modified else None
+
+            if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(tag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag, weak=True)
+            if modified is not None:
+                response.last_modified = modified
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapped
+    return decorator
+
+
+class Compressor:
+    """Compress eligible responses with brotli or gzip in ``after_request``."""
+
+    def init_app(self, app):
+        config = app.config
+        config.setdefault('COMPRESS_ENABLED', True)
+        config.setdefault('COMPRESS_MIN_SIZE', 500)
+        config.setdefault('COMPRESS_LEVEL', 6)
+        config.setdefault('COMPRESS_BR_QUALITY', 4)
+        config.setdefault('COMPRESS_MIMETYPES', COMPRESSIBLE_MIMETYPES)
+        self.config = config
+        app.after_request(self.compress)
+        app.extensions['compressor'] = self
+
+    def compress(self, response):
+        config = self.config
+        if (not config['COMPRESS_ENABLED']
+                or response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in config['COMPRESS_MIMETYPES']):
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.content_length or 0) < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            body = brotli.compress(response.get_data(), quality=config['COMPRESS_BR_QUALITY'])
+            encoding = 'br'
+        elif accepted['gzip']:
+            body = gzip.compress(response.get_data(), compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+            encoding = 'gzip'
+        else:
+            return response
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,91 @@
+"""Per-process cache of the signed-in user's identity for Flask-Login.
+
+``load_user`` runs on every authenticated request; instead of loading the ORM
+``User`` row (and issuing more queries whenever templates touch its dynamic
+relationships) it returns a slim, immutable :class:`Principal` kept in memory
+for a short TTL. Routes that change a user load the ORM row themselves and
+call :meth:`IdentityCache.invalidate` after committing.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class Principal:
+    """The read-only view of a user that ``current_user`` exposes."""
+
+    __slots__ = ('id', 'email', 'chosen_language', 'enrolled_course_ids')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, id, email, chosen_language, enrolled_course_ids):
+        self.id = id
+        self.email = email
+        self.chosen_language = chosen_language
+        self.enrolled_course_ids = frozenset(enrolled_course_ids)
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f'<Principal {self.email}>'
+
+
+class IdentityCache:
+    """TTL/LRU cache of :class:`Principal` objects keyed by user id.
+
+    ``loader(user_id)`` builds a principal from the database, or returns
+    ``None`` for an unknown id (which is never cached).
+    """
+
+    def __init__(self, loader=None, ttl=30, max_entries=10000):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app, loader):
+        self.loader = loader
+        self.ttl = app.config.setdefault('IDENTITY_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.setdefault('IDENTITY_CACHE_MAX_ENTRIES', self.max_entries)
+        app.extensions['identity_cache'] = self
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self._generation
+        principal = self.loader(user_id)
+        if principal is not None:
+            with self._lock:
+                if generation != self._generation:
+                    return principal # Invalidated while loading; don't cache a stale copy
+                self._entries[user_id] = (principal, now + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return principal
+
+    def invalidate(self, user_id=None):
+        """Forget one user, or everyone when ``user_id`` is ``None``."""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,229 @@
+"""Per-request SQL, template and timing instrumentation.
+
+When ``METRICS_ENABLED`` is set, :class:`RequestMetrics` hooks SQLAlchemy's
+``before/after_cursor_execute`` events and Flask's request and template
+signals. For every request it records:
+
+- the number of SQL statements and the time spent in them;
+- template render time;
+- time in named phases such as password hashing;
+- total time.
+
+Totals are aggregated per endpoint and rendered in the Prometheus text
+format by :meth:`RequestMetrics.render`. A statement shape (the SQL text,
+with expanded ``IN`` lists collapsed) executed more than
+``METRICS_NPLUSONE_THRESHOLD`` times in one request is logged as a likely
+N+1 query. Requests slower than ``SLOW_REQUEST_MS`` are logged with their
+breakdown.
+
+With neither metrics nor the slow log enabled nothing is hooked, and
+:meth:`RequestMetrics.phase` returns a shared no-op context manager.
+"""
+import contextlib
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+from flask import before_render_template, request, request_finished, request_started, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)')
+_NOOP = contextlib.nullcontext()
+
+
+class _RequestStats:
+    __slots__ = ('started', 'queries', 'sql_time', 'render_time', 'render_started', 'phases', 'shapes')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+        self.phases = Counter()
+        self.shapes = Counter()
+
+
+class _EndpointStats:
+    __slots__ = ('requests', 'duration', 'buckets', 'queries', 'sql_time', 'render_time', 'phases', 'nplusone', 'slow')
+
+    def __init__(self):
+        self.requests = 0
+        self.duration = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.phases = Counter()
+        self.nplusone = 0
+        self.slow = 0
+
+
+def statement_shape(statement):
+    """The statement with expanded ``IN (?, ?, ...)`` lists collapsed to one placeholder."""
+    return _IN_LIST.sub('(?)', statement)
+
+
+class RequestMetrics:
+    """Collects per-request timings; see the module docstring for the config keys."""
+
+    def __init__(self):
+        self.enabled = False
+        self.active = False
+        self.nplusone_threshold = 10
+        self.slow_request_ms = 0
+        self._current = ContextVar('request_metrics', default=None)
+        self._endpoints = defaultdict(_EndpointStats)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('METRICS_ENABLED', False)
+        self.nplusone_threshold = app.config.setdefault('METRICS_NPLUSONE_THRESHOLD', self.nplusone_threshold)
+        self.slow_request_ms = app.config.setdefault('SLOW_REQUEST_MS', self.slow_request_ms)
+        app.extensions['request_metrics'] = self
+        # The slow log needs the same per-request numbers, even without /metrics
+        self.active = bool(self.enabled or self.slow_request_ms)
+        if not self.active:
+            return
+        # Engine-class events cover every engine the app creates, including binds
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        request_started.connect(self._request_started, app, weak=False)
+        request_finished.connect(self._request_finished, app, weak=False)
+        before_render_template.connect(self._before_render, app, weak=False)
+        template_rendered.connect(self._rendered, app, weak=False)
+
+    def phase(self, name):
+        """Context manager timing a named part of the current request (e.g. password hashing)."""
+        if not self.active or self._current.get() is None:
+            return _NOOP
+        return self._phase(name)
+
+    @contextlib.contextmanager
+    def _phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = self._current.get()
+            if stats is not None:
+                stats.phases[name] += time.perf_counter() - started
+
+    # --- Hooks ---
+    def _request_started(self, sender, **extra):
+        self._current.set(_RequestStats())
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's execution context, which is discarded with it
+        # when the statement raises and after_cursor_execute never runs
+        if self._current.get() is not None:
+            context._metrics_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = self._current.get()
+        started = getattr(context, '_metrics_query_started', None)
+        if stats is None or started is None:
+            return
+        stats.sql_time += time.perf_counter() - started
+        stats.queries += 1
+        stats.shapes[statement] += 1
+
+    def _before_render(self, sender, template, context, **extra):
+        stats = self._current.get()
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+
+    def _rendered(self, sender, template, context, **extra):
+        stats = self._current.get()
+        if stats is not None and stats.render_started is not None:
+            stats.render_time += time.perf_counter() - stats.render_started
+            stats.render_started = None
+
+    def _request_finished(self, sender, response, **extra):
+        stats = self._current.get()
+        if stats is None:
+            return
+        self._current.set(None)
+        duration = time.perf_counter() - stats.started
+        endpoint = request.endpoint or 'unmatched'
+
+        repeated = Counter()
+        for statement, count in stats.shapes.items():
+            repeated[statement_shape(statement)] += count
+        suspects = [(shape, count) for shape, count in repeated.items() if count > self.nplusone_threshold]
+        for shape, count in suspects:
+            logger.warning('Possible N+1 in %s: statement ran %d times: %s', endpoint, count, ' '.join(shape.split())[:300])
+        slow = self.slow_request_ms and duration * 1000 >= self.slow_request_ms
+        if slow:
+            logger.warning('Slow request %s %s (%s): %.1fms total, %d queries in %.1fms, templates %.1fms%s',
+                           request.method, request.full_path.rstrip('?'), endpoint, duration * 1000,
+                           stats.queries, stats.sql_time * 1000, stats.render_time * 1000,
+                           ''.join(f', {name} {seconds * 1000:.1f}ms' for name, seconds in stats.phases.items()))
+
+        with self._lock:
+            totals = self._endpoints[endpoint]
+            totals.requests += 1
+            totals.duration += duration
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    totals.buckets[i] += 1
+            totals.queries += stats.queries
+            totals.sql_time += stats.sql_time
+            totals.render_time += stats.render_time
+            totals.phases.update(stats.phases)
+            totals.nplusone += len(suspects)
+            totals.slow += bool(slow)
+
+    # --- Exposition ---
+    def render(self):
+        """The aggregated metrics in the Prometheus text exposition format."""
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            snapshot = [(name, stats.requests, stats.duration, list(stats.buckets), stats.queries, stats.sql_time,
+                         stats.render_time, dict(stats.phases), stats.nplusone, stats.slow)
+                        for name, stats in endpoints]
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        def label(endpoint, **extra):
+            pairs = {'endpoint': endpoint, **extra}
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + '}'
+
+        histogram = []
+        for endpoint, requests, duration, buckets, *_ in snapshot:
+            for bound, count in zip(DURATION_BUCKETS, buckets):
+                histogram.append(f'http_request_duration_seconds_bucket{label(endpoint, le=repr(bound))} {count}')
+            histogram.append(f'http_request_duration_seconds_bucket{label(endpoint, le="+Inf")} {requests}')
+            histogram.append(f'http_request_duration_seconds_sum{label(endpoint)} {duration:.6f}')
+            histogram.append(f'http_request_duration_seconds_count{label(endpoint)} {requests}')
+        family('http_request_duration_seconds', 'histogram', 'Total request time per endpoint.', histogram)
+        family('http_sql_queries_total', 'counter', 'SQL statements executed per endpoint.',
+               [f'http_sql_queries_total{label(row[0])} {row[4]}' for row in snapshot])
+        family('http_sql_duration_seconds_total', 'counter', 'Time spent executing SQL per endpoint.',
+               [f'http_sql_duration_seconds_total{label(row[0])} {row[5]:.6f}' for row in snapshot])
+        family('http_template_render_seconds_total', 'counter', 'Time spent rendering templates per endpoint.',
+               [f'http_template_render_seconds_total{label(row[0])} {row[6]:.6f}' for row in snapshot])
+        family('http_phase_seconds_total', 'counter', 'Time spent in named phases (e.g. password_hash) per endpoint.',
+               [f'http_phase_seconds_total{label(row[0], phase=phase)} {seconds:.6f}'
+                for row in snapshot for phase, seconds in sorted(row[7].items())])
+        family('http_nplusone_warnings_total', 'counter', 'Statement shapes repeated beyond the N+1 threshold.',
+               [f'http_nplusone_warnings_total{label(row[0])} {row[8]}' for row in snapshot])
+        family('http_slow_requests_total', 'counter', 'Requests slower than SLOW_REQUEST_MS.',
+               [f'http_slow_requests_total{label(row[0])} {row[9]}' for row in snapshot])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,182 @@
+"""Ordered schema migrations tracked in a ``schema_version`` table.
+
+``db.create_all()`` only creates missing tables, so changes to tables that
+already exist in a deployed database (new indexes, new or altered columns) are
+registered here with :func:`migration` and applied in version order by
+:func:`upgrade`. A database created from scratch by the current models is
+stamped with the latest version instead of replaying every step.
+"""
+import json
+from collections import namedtuple
+
+from sqlalchemy import Column, Integer, MetaData, Table, func, inspect, insert, select, text
+
+Migration = namedtuple('Migration', ['version', 'description', 'upgrade'])
+
+MIGRATIONS = []
+
+_version_metadata = MetaData()
+schema_version = Table('schema_version', _version_metadata, Column('version', Integer, primary_key=True))
+
+
+def migration(version, description):
+    """Register ``fn(connection)`` as the step that upgrades to ``version``."""
+    def decorator(fn):
+        MIGRATIONS.append(Migration(version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return decorator
+
+
+def head():
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def current_version(connection):
+    if not inspect(connection).has_table(schema_version.name):
+        return None
+    return connection.execute(select(func.max(schema_version.c.version))).scalar()
+
+
+def status(engine):
+    """``(current, head)`` versions; ``current`` is None for a database never upgraded or stamped."""
+    with engine.connect() as connection:
+        return current_version(connection), head()
+
+
+def upgrade(engine, metadata):
+    """Create missing tables and apply pending migrations in one transaction.
+
+    Returns the list of :class:`Migration` steps that were applied.
+    """
+    with engine.begin() as connection:
+        is_new = not set(inspect(connection).get_table_names()) & set(metadata.tables)
+        _version_metadata.create_all(connection)
+        metadata.create_all(connection)
+        current = current_version(connection)
+        if current is None and is_new:
+            _stamp(connection, head())
+            return []
+        pending = [m for m in MIGRATIONS if m.version > (current or 0)]
+        for step in pending:
+            step.upgrade(connection)
+            _stamp(connection, step.version)
+    return pending
+
+
+def stamp(engine, version=None):
+    """Record ``version`` (default: latest) without running any migration."""
+    with engine.begin() as connection:
+        _version_metadata.create_all(connection)
+        _stamp(connection, head() if version is None else version)
+
+
+def _stamp(connection, version):
+    if version and not connection.execute(
+            select(schema_version.c.version).where(schema_version.c.version == version)).first():
+        connection.execute(insert(schema_version).values(version=version))
+
+
+def _create_index(connection, name, table, *columns):
+    quote = connection.dialect.identifier_preparer.quote
+    connection.execute(text(
+        f'CREATE INDEX IF NOT EXISTS {quote(name)} ON {quote(table)} ({", ".join(quote(c) for c in columns)})'
+    ))
+
+
+def _drop_index(connection, name):
+    connection.execute(text(f'DROP INDEX IF EXISTS {connection.dialect.identifier_preparer.quote(name)}'))
+
+
+def _has_column(connection, table, column):
+    return any(c['name'] == column for c in inspect(connection).get_columns(table))
+
+
+# --- Migrations ---
+@migration(1, 'Index foreign keys and hot filter columns')
+def add_hot_path_indexes(connection):
+    _create_index(connection, 'ix_enrollments_course_id', 'enrollments', 'course_id')
+    _create_index(connection, 'ix_courses_language_level', 'courses', 'language', 'level')
+    _create_index(connection, 'ix_modules_course_id_order', 'modules', 'course_id', 'order')
+    _create_index(connection, 'ix_lessons_module_id_lesson_number', 'lessons', 'module_id', 'lesson_number')
+    _create_index(connection, 'ix_quizzes_lesson_id', 'quizzes', 'lesson_id')
+    _create_index(connection, 'ix_quiz_attempts_user_quiz_attempted', 'quiz_attempts',
+                  'user_id', 'quiz_id', 'attempted_at')
+    _create_index(connection, 'ix_quiz_attempts_quiz_id', 'quiz_attempts', 'quiz_id')
+    _create_index(connection, 'ix_forum_posts_user_id', 'forum_posts', 'user_id')
+    _create_index(connection, 'ix_forum_posts_created_at', 'forum_posts', 'created_at')
+    _create_index(connection, 'ix_comments_post_id', 'comments', 'post_id')
+    _create_index(connection, 'ix_comments_user_id', 'comments', 'user_id')
+
+
+@migration(2, 'Widen users.password_hash for scrypt hashes')
+def widen_password_hash(connection):
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        connection.execute(text('ALTER TABLE users ALTER COLUMN password_hash TYPE VARCHAR(256)'))
+    elif dialect == 'mysql':
+        connection.execute(text('ALTER TABLE users MODIFY password_hash VARCHAR(256) NOT NULL'))
+    # SQLite does not enforce VARCHAR lengths
+
+
+@migration(3, 'Keyset pagination indexes and denormalized comment counts for the forum')
+def forum_keyset_pagination(connection):
+    # The (created_at, id) composites supersede the single-column indexes from migration 1
+    _drop_index(connection, 'ix_forum_posts_created_at')
+    _drop_index(connection, 'ix_comments_post_id')
+    _create_index(connection, 'ix_forum_posts_created_at_id', 'forum_posts', 'created_at', 'id')
+    _create_index(connection, 'ix_forum_posts_language_created_at_id', 'forum_posts', 'language', 'created_at', 'id')
+    _create_index(connection, 'ix_forum_posts_topic_created_at_id', 'forum_posts', 'topic', 'created_at', 'id')
+    _create_index(connection, 'ix_comments_post_id_created_at_id', 'comments', 'post_id', 'created_at', 'id')
+    if not _has_column(connection, 'forum_posts', 'comment_count'):
+        connection.execute(text('ALTER TABLE forum_posts ADD COLUMN comment_count INTEGER DEFAULT 0 NOT NULL'))
+    connection.execute(text(
+        'UPDATE forum_posts SET comment_count = '
+        '(SELECT COUNT(*) FROM comments WHERE comments.post_id = forum_posts.id)'
+    ))
+
+
+@migration(4, 'Index quiz_attempts.attempted_at for date-range reports')
+def index_attempted_at(connection):
+    _create_index(connection, 'ix_quiz_attempts_attempted_at', 'quiz_attempts', 'attempted_at')
+
+
+@migration(5, 'Store quiz options as JSON lists and add accepted_answers')
+def structured_quiz_options(connection):
+    # Comma-joined option strings become JSON arrays, rewritten row by row so
+    # every dialect ends up with the same values
+    rows = connection.execute(text('SELECT id, options FROM quizzes WHERE options IS NOT NULL')).all()
+    for quiz_id, options in rows:
+        if isinstance(options, str) and not options.lstrip().startswith('['):
+            choices = [o.strip() for o in options.split(',') if o.strip()]
+            connection.execute(text('UPDATE quizzes SET options = :options WHERE id = :id'),
+                               {'options': json.dumps(choices), 'id': quiz_id})
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        connection.execute(text('ALTER TABLE quizzes ALTER COLUMN options TYPE JSON USING options::json'))
+    elif dialect == 'mysql':
+        connection.execute(text('ALTER TABLE quizzes MODIFY options JSON NULL'))
+    if not _has_column(connection, 'quizzes', 'accepted_answers'):
+        connection.execute(text('ALTER TABLE quizzes ADD COLUMN accepted_answers JSON'))
+
+
+@migration(6, 'Background task queue table')
+def task_queue_table(connection):
+    # upgrade() creates the new tasks table before running migrations; the version
+    # bump makes workers on an older schema warn instead of failing to enqueue
+    pass
+
+
+@migration(7, 'Full-text search table')
+def search_table(connection):
+    # `flask db-upgrade` creates and fills the FTS5 table after the migrations
+    # (SearchIndex.create); web workers only check that it exists, and the
+    # version bump makes them warn until it does
+    pass
+
+
+@migration(8, 'Rename user_progress.best_score to quizzes_solved')
+def rename_best_score(connection):
+    # The column counts distinct solved quizzes; it was never a score
+    if _has_column(connection, 'user_progress', 'best_score'):
+        connection.execute(text('ALTER TABLE user_progress RENAME COLUMN best_score TO quizzes_solved'))
@@ -0,0 +1,232 @@
+import datetime
+
+from flask_login import UserMixin
+from sqlalchemy import select
+
+from extensions import db, identity_cache, login_manager, password_hasher, request_metrics
+from identity_cache import Principal
+
+# Association table for User-Course many-to-many relationship
+enrollments = db.Table('enrollments',
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
+    db.Column('course_id', db.Integer, db.ForeignKey('courses.id'), primary_key=True),
+    db.Index('ix_enrollments_course_id', 'course_id') # The primary key already covers lookups by user
+)
+
+# --- Database Models ---
+class User(UserMixin, db.Model):
+    __tablename__ = 'users'
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
+    chosen_language = db.Column(db.String(50), nullable=True)
+    # progress = db.Column(db.JSON, nullable=True) # Or a separate table for progress
+
+    # Relationships
+    quiz_attempts = db.relationship('QuizAttempt', backref='user', lazy=True)
+    forum_posts = db.relationship('ForumPost', backref='author', lazy='dynamic')
+    comments = db.relationship('Comment', backref='author', lazy='dynamic')
+    enrolled_courses = db.relationship(
+        'Course', secondary=enrollments,
+        backref=db.backref('enrolled_by_users', lazy='dynamic'),
+        lazy='dynamic'
+    )
+
+    def set_password(self, password):
+        with request_metrics.phase('password_hash'):
+            self.password_hash = password_hasher.hash(password)
+
+    def check_password(self, password):
+        with request_metrics.phase('password_hash'):
+            return password_hasher.verify(self.password_hash, password)
+
+    def __repr__(self):
+        return f'<User {self.email}>'
+
+def load_principal(user_id):
+    row = db.session.execute(
+        select(User.id, User.email, User.chosen_language).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    course_ids = db.session.execute(
+        select(enrollments.c.course_id).where(enrollments.c.user_id == user_id)
+    ).scalars()
+    return Principal(row.id, row.email, row.chosen_language, course_ids)
+
+@login_manager.user_loader
+def load_user(user_id):
+    return identity_cache.get(int(user_id))
+
+class Course(db.Model):
+    __tablename__ = 'courses'
+    __table_args__ = (db.Index('ix_courses_language_level', 'language', 'level'),)
+    id = db.Column(db.Integer, primary_key=True)
+    language = db.Column(db.String(50), nullable=False)
+    level = db.Column(db.String(50), nullable=False) # Beginner, Intermediate, Advanced
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    image_url = db.Column(db.String(200), nullable=True) # For course thumbnail/banner
+    learning_objectives = db.Column(db.Text, nullable=True) # What students will learn
+    # Relationship to Modules
+    modules = db.relationship('Module', backref='course', lazy=True, cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f'<Course {self.title}>'
+
+class Module(db.Model):
+    __tablename__ = 'modules'
+    __table_args__ = (db.Index('ix_modules_course_id_order', 'course_id', 'order'),)
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    title = db.Column(db.String(150), nullable=False)
+    order = db.Column(db.Integer, nullable=False) # To order modules within a course
+    description = db.Column(db.Text, nullable=True) # Optional description for the module
+    lessons = db.relationship('Lesson', backref='module', lazy=True, cascade="all, delete-orphan", order_by='Lesson.lesson_number')
+
+    def __repr__(self):
+        return f'<Module {self.title}>'
+
+class Lesson(db.Model):
+    __tablename__ = 'lessons'
+    __table_args__ = (db.Index('ix_lessons_module_id_lesson_number', 'module_id', 'lesson_number'),)
+    id = db.Column(db.Integer, primary_key=True)
+    module_id = db.Column(db.Integer, db.ForeignKey('modules.id'), nullable=False)
+    lesson_number = db.Column(db.Integer, nullable=False) # For ordering within a module
+    title = db.Column(db.String(100), nullable=False)
+    content = db.Column(db.Text, nullable=False) # Rich text, paths to images/audio
+    video_url = db.Column(db.String(200), nullable=True)
+    estimated_duration = db.Column(db.String(50), nullable=True) # e.g., "20 minutes"
+    quizzes = db.relationship('Quiz', backref='lesson', lazy=True, cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f'<Lesson {self.title}>'
+
+class Quiz(db.Model):
+    __tablename__ = 'quizzes'
+    id = db.Column(db.Integer, primary_key=True)
+    lesson_id = db.Column(db.Integer, db.ForeignKey('lessons.id'), nullable=False, index=True)
+    question = db.Column(db.Text, nullable=False)
+    options = db.Column(db.JSON, nullable=True) # List of choices for multiple_choice quizzes
+    correct_answer = db.Column(db.String(100), nullable=False)
+    accepted_answers = db.Column(db.JSON, nullable=True) # Other accepted spellings, e.g. for fill_in_blank
+    quiz_type = db.Column(db.String(20), default='multiple_choice') # 'multiple_choice', 'true_false', 'fill_in_blank'
+    quiz_attempts = db.relationship('QuizAttempt', backref='quiz', lazy=True)
+
+    def __repr__(self):
+        return f'<Quiz {self.question[:30]}>'
+
+class QuizAttempt(db.Model):
+    __tablename__ = 'quiz_attempts'
+    __table_args__ = (db.Index('ix_quiz_attempts_user_quiz_attempted', 'user_id', 'quiz_id', 'attempted_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False, index=True)
+    selected_answer = db.Column(db.String(100), nullable=False)
+    is_correct = db.Column(db.Boolean, nullable=False)
+    attempted_at = db.Column(db.DateTime, server_default=db.func.now(), index=True) # Date-range reports and rollups
+
+    def __repr__(self):
+        return f'<QuizAttempt by User {self.user_id} for Quiz {self.quiz_id}>'
+
+class ForumPost(db.Model):
+    __tablename__ = 'forum_posts'
+    # Board pages are ordered newest first on (created_at, id), optionally within a language or topic
+    __table_args__ = (
+        db.Index('ix_forum_posts_created_at_id', 'created_at', 'id'),
+        db.Index('ix_forum_posts_language_created_at_id', 'language', 'created_at', 'id'),
+        db.Index('ix_forum_posts_topic_created_at_id', 'topic', 'created_at', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    language = db.Column(db.String(50), nullable=True) # Optional, can be general
+    topic = db.Column(db.String(50), nullable=True) # e.g., Grammar, Vocabulary, Culture
+    title = db.Column(db.String(150), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    # Set client-side so every stored timestamp has the same format and compares exactly against cursors
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, server_default=db.func.now())
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Kept current by add_comment()
+    comments = db.relationship('Comment', backref='post', lazy='dynamic', cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f'<ForumPost {self.title}>'
+
+class Comment(db.Model):
+    __tablename__ = 'comments'
+    __table_args__ = (db.Index('ix_comments_post_id_created_at_id', 'post_id', 'created_at', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('forum_posts.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<Comment by User {self.user_id} on Post {self.post_id}>'
+
+class UserProgress(db.Model):
+    # Precomputed learning aggregates, one row per (user, scope, scope_id), kept
+    # current as quiz attempts are recorded so progress pages never scan attempts.
+    __tablename__ = 'user_progress'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    scope = db.Column(db.String(10), primary_key=True) # 'quiz', 'lesson', 'module' or 'course'
+    scope_id = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)
+    quizzes_solved = db.Column(db.Integer, nullable=False, default=0) # Distinct quizzes answered correctly
+    last_activity_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<UserProgress User {self.user_id} {self.scope} {self.scope_id}>'
+
+class QuizAttemptDaily(db.Model):
+    # Materialized per-day attempt counts for dashboards, refreshed by `flask report rollup`
+    __tablename__ = 'quiz_attempt_daily'
+    day = db.Column(db.Date, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), primary_key=True, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<QuizAttemptDaily {self.day} Quiz {self.quiz_id}>'
+
+class ReviewState(db.Model):
+    # Spaced-repetition memory state per (user, quiz), updated as attempts are
+    # recorded; the (user_id, due_at) index answers "what is due now" directly
+    __tablename__ = 'review_states'
+    __table_args__ = (db.Index('ix_review_states_user_id_due_at', 'user_id', 'due_at'),)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), primary_key=True)
+    ease = db.Column(db.Float, nullable=False)
+    interval_days = db.Column(db.Float, nullable=False)
+    repetitions = db.Column(db.Integer, nullable=False, default=0)
+    lapses = db.Column(db.Integer, nullable=False, default=0)
+    due_at = db.Column(db.DateTime, nullable=False)
+    last_reviewed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<ReviewState User {self.user_id} Quiz {self.quiz_id} due {self.due_at}>'
+
+class Task(db.Model):
+    # Background task queue (see task_queue.py). Workers claim due tasks on
+    # (status, run_at) and find expired leases on (status, locked_until).
+    __tablename__ = 'tasks'
+    __table_args__ = (
+        db.Index('ix_tasks_status_run_at', 'status', 'run_at'),
+        db.Index('ix_tasks_status_locked_until', 'status', 'locked_until'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='queued') # 'queued', 'running', 'done' or 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False)
+    idempotency_key = db.Column(db.String(200), unique=True, nullable=True)
+    run_at = db.Column(db.DateTime, nullable=False) # Not before; pushed back by retry backoff
+    locked_by = db.Column(db.String(100), nullable=True) # Worker holding the lease
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Task {self.name} #{self.id} {self.status}>'
@@ -0,0 +1,77 @@
+"""Configurable password hashing that runs off the request threads.
+
+Hashing and verification use Werkzeug's ``generate_password_hash`` and
+``check_password_hash`` with a configurable method string such as
+``scrypt:32768:8:1`` or ``pbkdf2:sha256:600000``. With
+``PASSWORD_HASH_WORKERS`` > 0 the work runs in a bounded process pool, so a
+burst of logins neither holds the GIL nor starves other requests; with 0 it
+runs inline. Hashes made with other parameters still verify, and
+:meth:`PasswordHasher.needs_rehash` tells the login route to upgrade them.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+
+    def __init__(self, method='scrypt', workers=0, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self._canonical_method = None
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.method = app.config.setdefault('PASSWORD_HASH_METHOD', self.method)
+        self.workers = app.config.setdefault('PASSWORD_HASH_WORKERS', self.workers)
+        self.timeout = app.config.setdefault('PASSWORD_HASH_TIMEOUT', self.timeout)
+        self._canonical_method = None
+        atexit.register(self.shutdown)
+        app.extensions['password_hasher'] = self
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True if ``stored_hash`` was made with a different method or cost."""
+        return stored_hash.split('$', 1)[0] != self.canonical_method
+
+    @property
+    def canonical_method(self):
+        # Werkzeug fills in default parameters ('scrypt' -> 'scrypt:32768:8:1');
+        # hashing once tells us exactly what new hashes will record.
+        if self._canonical_method is None:
+            self._canonical_method = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._canonical_method
+
+    def shutdown(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        return self._executor().submit(fn, *args).result(timeout=self.timeout)
+
+    def _executor(self):
+        # Pools are per process: a worker forked from a preloaded parent
+        # creates its own on first use. 'spawn' keeps the children free of
+        # locks held by the parent's threads.
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+        return self._pool
@@ -0,0 +1,103 @@
+"""Answer checkers compiled once per quiz definition.
+
+:func:`compile_checker` turns a quiz's type, correct answer and accepted
+variants into an immutable checker. Normalizing the accepted answers happens
+once, at compile time, so grading a submission is one normalization of the
+submitted text plus a set lookup. The catalog cache stores a checker on every
+quiz snapshot, so each quiz is compiled once per catalog version.
+"""
+import re
+import unicodedata
+
+_WHITESPACE = re.compile(r'\s+')
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize(answer):
+    """Case-fold and collapse whitespace."""
+    return _WHITESPACE.sub(' ', answer or '').strip().casefold()
+
+
+def fold(answer):
+    """:func:`normalize`, then drop accents and punctuation ("¿Mañana?" -> "manana")."""
+    decomposed = unicodedata.normalize('NFKD', _PUNCTUATION.sub(' ', answer or ''))
+    return normalize(''.join(c for c in decomposed if not unicodedata.combining(c)))
+
+
+class AnswerChecker:
+    """Accepts answers whose normalized form matches the correct answer or a variant."""
+
+    __slots__ = ('correct_answer', 'accepted')
+    quiz_type = 'multiple_choice'
+
+    def __init__(self, correct_answer, variants=()):
+        accepted = frozenset(self.normalize(v) for v in (correct_answer, *variants) if v)
+        object.__setattr__(self, 'correct_answer', correct_answer)
+        object.__setattr__(self, 'accepted', accepted)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    @staticmethod
+    def normalize(answer):
+        return normalize(answer)
+
+    def grade(self, answer):
+        return self.normalize(answer) in self.accepted
+
+    def __repr__(self):
+        # Sorted so the repr (part of catalog content digests) is the same in every process
+        return f'{type(self).__name__}({self.correct_answer!r}, {sorted(self.accepted)!r})'
+
+
+class MultipleChoiceChecker(AnswerChecker):
+    __slots__ = ()
+
+
+class FillInBlankChecker(AnswerChecker):
+    """Typed answers: also ignores accents and punctuation."""
+
+    __slots__ = ()
+    quiz_type = 'fill_in_blank'
+
+    @staticmethod
+    def normalize(answer):
+        return fold(answer)
+
+
+class TrueFalseChecker(AnswerChecker):
+    __slots__ = ()
+    quiz_type = 'true_false'
+    SPELLINGS = {True: ('true', 't', 'yes', 'y', '1'), False: ('false', 'f', 'no', 'n', '0')}
+
+    def __init__(self, correct_answer, variants=()):
+        super().__init__(correct_answer)
+        value = next((v for v, spellings in self.SPELLINGS.items() if normalize(correct_answer) in spellings), None)
+        object.__setattr__(self, 'accepted', frozenset(self.SPELLINGS.get(value, self.accepted)))
+
+
+CHECKERS = {
+    'multiple_choice': MultipleChoiceChecker,
+    'true_false': TrueFalseChecker,
+    'fill_in_blank': FillInBlankChecker,
+    'short_answer': FillInBlankChecker,
+}
+
+
+def compile_checker(quiz_type, correct_answer, accepted_answers=None):
+    """Build the checker for one quiz; unknown types grade like multiple choice."""
+    return CHECKERS.get(quiz_type, MultipleChoiceChecker)(correct_answer, accepted_answers or ())
+
+
+def parse_choices(value):
+    """Coerce stored or imported options to a list of strings.
+
+    Accepts a list, a legacy comma-joined string or ``None``.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    elif isinstance(value, dict):
+        value = value.values()
+    return [str(v).strip() for v in value if str(v).strip()]
@@ -0,0 +1,242 @@
+"""Streaming quiz-attempt reports.
+
+Attempts are read in fixed-size batches from a server-side cursor and folded
+into per-quiz counters, so memory depends on the size of the catalog, never on
+the number of attempts. With NumPy installed each batch is aggregated with
+vectorized ``bincount`` calls; without it the same counters are kept in plain
+Python. Report rows are written incrementally as CSV, or as Parquet when
+pyarrow is installed.
+"""
+import csv
+import os
+import sys
+from collections import namedtuple
+
+from quiz_checker import normalize as normalize_answer
+
+try:
+    import numpy as np
+except ImportError: # Optional dependency; aggregation falls back to pure Python
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Optional dependency; only needed for Parquet output
+    pa = pq = None
+
+QuizInfo = namedtuple('QuizInfo', ['id', 'course_id', 'question', 'options', 'correct_answer'])
+
+OTHER_ANSWER = '(other)'
+
+# Report schemas as (column, type) pairs. Types are declared rather than
+# inferred, so a column that is empty (all None) in one batch still gets the
+# same Parquet type as in every other batch.
+QUIZ_DIFFICULTY_COLUMNS = (
+    ('quiz_id', 'int64'), ('course_id', 'int64'), ('question', 'string'), ('attempts', 'int64'),
+    ('correct', 'int64'), ('correct_rate', 'float64'), ('difficulty', 'float64'),
+)
+ANSWER_DISTRIBUTION_COLUMNS = (
+    ('quiz_id', 'int64'), ('answer', 'string'), ('is_correct_answer', 'bool'), ('count', 'int64'),
+    ('share', 'float64'),
+)
+COURSE_PASS_RATE_COLUMNS = (
+    ('course_id', 'int64'), ('title', 'string'), ('attempts', 'int64'), ('correct', 'int64'),
+    ('correct_rate', 'float64'), ('learners', 'int64'), ('passed', 'int64'), ('pass_rate', 'float64'),
+)
+ATTEMPT_EXPORT_COLUMNS = (
+    ('id', 'int64'), ('user_id', 'int64'), ('quiz_id', 'int64'), ('lesson_id', 'int64'), ('module_id', 'int64'),
+    ('course_id', 'int64'), ('selected_answer', 'string'), ('is_correct', 'bool'), ('attempted_at', 'timestamp'),
+)
+
+
+def stream_batches(connection, statement, batch_size=10000):
+    """Yield lists of rows for ``statement`` read through a server-side cursor."""
+    result = connection.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
+
+
+class AttemptAggregator:
+    """Per-quiz attempt, correctness and answer-choice counters.
+
+    ``quizzes`` is an iterable of :class:`QuizInfo`. Feed attempts with
+    :meth:`add` as ``(quiz_id, selected_answer, is_correct)`` rows; attempts
+    for quizzes not in the catalog are ignored.
+    """
+
+    def __init__(self, quizzes, use_numpy=None):
+        self.quizzes = sorted(quizzes, key=lambda q: q.id)
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        self._index = {quiz.id: i for i, quiz in enumerate(self.quizzes)}
+        # Every (quiz, option) pair gets a dense answer code; each quiz also has
+        # a catch-all code for free-text or since-removed answers.
+        self._answer_codes = {}
+        self._answers = []
+        self._other_code = []
+        for quiz in self.quizzes:
+            for option in quiz.options:
+                key = (quiz.id, normalize_answer(option))
+                if key not in self._answer_codes:
+                    self._answer_codes[key] = len(self._answers)
+                    self._answers.append((quiz.id, option.strip()))
+            self._other_code.append(len(self._answers))
+            self._answers.append((quiz.id, OTHER_ANSWER))
+        size, codes = len(self.quizzes), len(self._answers)
+        if self.use_numpy:
+            self._ids = np.array([quiz.id for quiz in self.quizzes], dtype=np.int64)
+            self._other_codes = np.array(self._other_code, dtype=np.int64)
+            self.attempts = np.zeros(size, dtype=np.int64)
+            self.correct = np.zeros(size, dtype=np.int64)
+            self.answer_counts = np.zeros(codes, dtype=np.int64)
+        else:
+            self.attempts = [0] * size
+            self.correct = [0] * size
+            self.answer_counts = [0] * codes
+        self.total = 0
+
+    def add(self, rows):
+        if self.use_numpy:
+            self._add_vectorized(rows)
+        else:
+            self._add_python(rows)
+
+    def _add_python(self, rows):
+        index, codes, other = self._index, self._answer_codes, self._other_code
+        for quiz_id, answer, is_correct in rows:
+            i = index.get(quiz_id)
+            if i is None:
+                continue
+            self.attempts[i] += 1
+            self.correct[i] += bool(is_correct)
+            self.answer_counts[codes.get((quiz_id, normalize_answer(answer)), other[i])] += 1
+            self.total += 1
+
+    def _add_vectorized(self, rows):
+        if not rows or not len(self._ids):
+            return
+        quiz_ids, answers, is_correct = zip(*rows)
+        # Strings cannot be vectorized; mapping answers to codes is the one per-row Python step
+        codes = self._answer_codes
+        answer_codes = np.fromiter((codes.get((q, normalize_answer(a)), -1) for q, a in zip(quiz_ids, answers)),
+                                   dtype=np.int64, count=len(rows))
+        quiz_ids = np.fromiter(quiz_ids, dtype=np.int64, count=len(rows))
+        correct = np.fromiter((bool(c) for c in is_correct), dtype=bool, count=len(rows))
+        positions = np.minimum(np.searchsorted(self._ids, quiz_ids), len(self._ids) - 1)
+        known = self._ids[positions] == quiz_ids
+        positions, answer_codes, correct = positions[known], answer_codes[known], correct[known]
+        answer_codes = np.where(answer_codes < 0, self._other_codes[positions], answer_codes)
+        self.attempts += np.bincount(positions, minlength=len(self._ids))
+        self.correct += np.bincount(positions[correct], minlength=len(self._ids))
+        self.answer_counts += np.bincount(answer_codes, minlength=len(self._answers))
+        self.total += len(positions)
+
+    # --- Report rows ---
+    def quiz_difficulty(self):
+        for i, quiz in enumerate(self.quizzes):
+            attempts, correct = int(self.attempts[i]), int(self.correct[i])
+            rate = correct / attempts if attempts else None
+            yield (quiz.id, quiz.course_id, quiz.question, attempts, correct,
+                   _round(rate), _round(1 - rate if rate is not None else None))
+
+    def answer_distribution(self):
+        for code, (quiz_id, answer) in enumerate(self._answers):
+            i = self._index[quiz_id]
+            count, attempts = int(self.answer_counts[code]), int(self.attempts[i])
+            if answer == OTHER_ANSWER and not count:
+                continue
+            is_correct = normalize_answer(answer) == normalize_answer(self.quizzes[i].correct_answer)
+            yield quiz_id, answer, is_correct, count, _round(count / attempts if attempts else None)
+
+    def course_totals(self):
+        """Return ``{course_id: (attempts, correct)}``."""
+        totals = {}
+        for i, quiz in enumerate(self.quizzes):
+            attempts, correct = totals.get(quiz.course_id, (0, 0))
+            totals[quiz.course_id] = (attempts + int(self.attempts[i]), correct + int(self.correct[i]))
+        return totals
+
+
+def course_pass_rates(courses, totals, learners, passed):
+    """Rows for the per-course report.
+
+    ``courses`` maps course id to title, ``totals`` comes from
+    :meth:`AttemptAggregator.course_totals`, and ``learners``/``passed`` map
+    course id to learner counts.
+    """
+    for course_id, title in sorted(courses.items()):
+        attempts, correct = totals.get(course_id, (0, 0))
+        active, passing = learners.get(course_id, 0), passed.get(course_id, 0)
+        yield (course_id, title, attempts, correct, _round(correct / attempts if attempts else None),
+               active, passing, _round(passing / active if active else None))
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+# --- Output ---
+class CSVReportWriter:
+    def __init__(self, path, columns):
+        self._file = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ParquetReportWriter:
+    """Writes each batch of rows as a Parquet row group with the report's declared schema."""
+
+    def __init__(self, path, columns):
+        if pq is None:
+            raise RuntimeError('Parquet output requires pyarrow (pip install pyarrow)')
+        types = {'int64': pa.int64(), 'float64': pa.float64(), 'string': pa.string(), 'bool': pa.bool_(),
+                 'timestamp': pa.timestamp('us')}
+        self.schema = pa.schema([(name, types[type_name]) for name, type_name in columns])
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        columns = dict(zip(self.schema.names, (list(values) for values in zip(*rows))))
+        self._writer.write_table(pa.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_report(path, columns, output_format=None):
+    """Open a report writer, choosing the format from ``output_format`` or the file extension.
+
+    ``columns`` is a schema of ``(name, type)`` pairs such as :data:`QUIZ_DIFFICULTY_COLUMNS`.
+    """
+    if output_format is None:
+        output_format = 'parquet' if os.path.splitext(path)[1].lower() in ('.parquet', '.pq') else 'csv'
+    if output_format == 'parquet':
+        return ParquetReportWriter(path, columns)
+    return CSVReportWriter(path, columns)
+
+
+def write_report(path, columns, rows, output_format=None, chunk_size=10000):
+    """Write ``rows`` (any iterable) to ``path`` in chunks; returns the row count."""
+    writer = open_report(path, columns, output_format)
+    count, chunk = 0, []
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                writer.write(chunk)
+                count += len(chunk)
+                chunk = []
+        writer.write(chunk)
+        count += len(chunk)
+    finally:
+        writer.close()
+    return count
@@ -0,0 +1,444 @@
+"""Full-text search over catalog and forum content.
+
+Searchable models are registered as :class:`Source` entries (a kind name, the
+model, its title column and body columns). On SQLite builds with FTS5 the
+documents live in an FTS5 table updated in the same transaction as the rows
+they index, created and filled by :meth:`SearchIndex.create` (``flask
+db-upgrade``) or :meth:`SearchIndex.rebuild`; on other databases, or when FTS5 is missing, a pure-Python
+inverted index is kept in memory instead. Both fold case and accents the same
+way ("manana" finds "mañana"), treat the last query word as a prefix and rank
+with BM25, weighting title matches above body matches.
+
+Every matching document is ranked, however old. FTS5 scores and sorts the
+matches inside the extension (``ORDER BY rank``) and builds snippets only for
+the rows returned; the in-memory backend keeps just the best ``limit`` scores.
+"""
+import heapq
+import html
+import logging
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import namedtuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import event, inspect, select, text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+Source = namedtuple('Source', ['kind', 'model', 'title', 'body'])
+SearchHit = namedtuple('SearchHit', ['kind', 'id', 'title', 'snippet', 'score'])
+
+KIND_SLOTS = 8 # Document rowids are ref_id * KIND_SLOTS + source position
+MAX_QUERY_TERMS = 8
+MIN_PREFIX_LENGTH = 3 # Shorter prefixes expand to too many terms to be worth it
+SNIPPET_TOKENS = 12
+
+_TOKEN = re.compile(r'[^\W_]+')
+_TAG = re.compile(r'<[^>]+>')
+_MARK_OPEN, _MARK_CLOSE = '\x02', '\x03'
+
+
+def fold(value):
+    """Lower-case ``value`` and strip diacritics, like FTS5's ``remove_diacritics 2``."""
+    decomposed = unicodedata.normalize('NFKD', value)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(value):
+    return _TOKEN.findall(fold(value))
+
+
+def plain_text(value):
+    # Lesson bodies may contain markup; only the words are indexed
+    return html.unescape(_TAG.sub(' ', value or ''))
+
+
+def query_terms(query):
+    """Return ``(terms, prefix)``: the folded query words and whether the last is a prefix."""
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    return terms, bool(terms) and len(terms[-1]) >= MIN_PREFIX_LENGTH
+
+
+class SearchIndex:
+    """Keeps the search documents for every source current and answers queries.
+
+    ``SEARCH_BACKEND`` selects ``'fts5'``, ``'memory'`` or ``'auto'`` (FTS5 on
+    SQLite when available). ORM inserts, updates and deletes of source rows
+    are indexed automatically; writes that bypass the unit of work (Core bulk
+    inserts, imports) must be followed by :meth:`rebuild`.
+    """
+
+    def __init__(self, backend='auto', title_weight=10.0):
+        self.backend_name = backend
+        self.title_weight = title_weight
+        self.sources = ()
+        self._backend = None
+        self._db = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, sources):
+        self.backend_name = app.config.setdefault('SEARCH_BACKEND', self.backend_name)
+        self.title_weight = app.config.setdefault('SEARCH_TITLE_WEIGHT', self.title_weight)
+        if len(sources) >= KIND_SLOTS:
+            raise ValueError(f'at most {KIND_SLOTS - 1} search sources are supported')
+        self.sources = tuple(sources)
+        self._db = db
+        if not event.contains(db.session, 'after_flush', self._after_flush): # Once per process, however many apps
+            event.listen(db.session, 'after_flush', self._after_flush)
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+        app.extensions['search_index'] = self
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._create_backend()
+        return self._backend
+
+    def _create_backend(self):
+        engine = self._db.engine
+        name = self.backend_name
+        if name == 'auto':
+            name = 'fts5' if engine.dialect.name == 'sqlite' and fts5_available(engine) else 'memory'
+        if name == 'fts5':
+            return FTS5Backend(self, engine)
+        if name == 'memory':
+            return MemoryBackend(self)
+        raise ValueError(f'unknown SEARCH_BACKEND {name!r}')
+
+    # --- Documents ---
+    def documents(self, source, rows):
+        position = self.sources.index(source) + 1
+        for ref_id, title, *body in rows:
+            yield ref_id * KIND_SLOTS + position, plain_text(title), ' '.join(plain_text(b) for b in body)
+
+    def iter_documents(self, connection, batch_size=2000):
+        """Stream every document of every source from ``connection``."""
+        for source in self.sources:
+            columns = [getattr(source.model, c) for c in ('id', source.title, *source.body)]
+            result = connection.execute(select(*columns).execution_options(yield_per=batch_size))
+            yield from self.documents(source, result)
+
+    def decode(self, rowid):
+        return self.sources[rowid % KIND_SLOTS - 1].kind, rowid // KIND_SLOTS
+
+    def kind_positions(self, kinds):
+        return [i + 1 for i, source in enumerate(self.sources) if source.kind in kinds]
+
+    # --- Queries ---
+    def search(self, query, kinds=None, limit=20):
+        """Return up to ``limit`` :class:`SearchHit` for ``query``, best first."""
+        terms, prefix = query_terms(query)
+        if not terms:
+            return []
+        positions = self.kind_positions(kinds) if kinds else None
+        return self.backend.search(terms, prefix, positions, limit)
+
+    def create(self):
+        """Create and fill the stored index if it does not exist yet.
+
+        Returns the number of documents indexed, or None when there was nothing
+        to create (the index exists, or the backend keeps nothing in the database).
+        """
+        return self.backend.create()
+
+    def rebuild(self):
+        """Reindex every source from the database; returns the number of documents."""
+        return self.backend.rebuild()
+
+    # --- Incremental updates ---
+    def _after_flush(self, session, flush_context):
+        changes = {}
+        for obj in session.new:
+            self._collect(obj, changes)
+        for obj in session.dirty:
+            if session.is_modified(obj, include_collections=False):
+                self._collect(obj, changes, only_if_changed=True)
+        for obj in session.deleted:
+            source = self._source_of(obj)
+            if source is not None:
+                changes[obj.id * KIND_SLOTS + self.sources.index(source) + 1] = None
+        if not changes:
+            return
+        backend = self.backend
+        if backend.transactional:
+            backend.apply(changes, session.connection())
+        else:
+            session.info.setdefault('search_changes', {}).update(changes)
+
+    def _collect(self, obj, changes, only_if_changed=False):
+        source = self._source_of(obj)
+        if source is None:
+            return
+        if only_if_changed:
+            state = inspect(obj)
+            if not any(state.attrs[c].history.has_changes() for c in (source.title, *source.body)):
+                return
+        row = (obj.id, getattr(obj, source.title), *(getattr(obj, c) for c in source.body))
+        for rowid, title, body in self.documents(source, [row]):
+            changes[rowid] = (title, body)
+
+    def _source_of(self, obj):
+        for source in self.sources:
+            if isinstance(obj, source.model):
+                return source
+        return None
+
+    def _after_commit(self, session):
+        changes = session.info.pop('search_changes', None)
+        if changes:
+            self.backend.apply(changes)
+
+    def _after_rollback(self, session):
+        session.info.pop('search_changes', None)
+
+
+def fts5_available(engine):
+    with engine.connect() as connection:
+        try:
+            connection.exec_driver_sql('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            connection.exec_driver_sql('DROP TABLE temp.fts5_probe')
+        except OperationalError:
+            return False
+    return True
+
+
+def _snippet_markup(value):
+    return Markup(str(escape(value)).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>'))
+
+
+class FTS5Backend:
+    """Documents in an SQLite FTS5 table, written inside the indexing transaction."""
+
+    transactional = True
+    table = 'search_documents'
+
+    def __init__(self, index, engine):
+        self.index = index
+        self.engine = engine
+        self._ready = False
+        self._warned = False
+
+    def _ensure(self, connection):
+        # Only checks: the table is created by create()/rebuild() in a transaction
+        # of its own, never inside a request's, which might still roll back
+        if not self._ready:
+            self._ready = inspect(connection).has_table(self.table)
+            if not self._ready and not self._warned:
+                self._warned = True
+                logger.warning('The %s table is missing; run `flask db-upgrade` or `flask search-rebuild`.',
+                               self.table)
+        return self._ready
+
+    def _create(self, connection):
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+            f"title, body, tokenize='unicode61 remove_diacritics 2')"
+        )
+        return self._fill(connection)
+
+    def create(self):
+        with self.engine.begin() as connection:
+            if inspect(connection).has_table(self.table):
+                return None
+            total = self._create(connection)
+        self._ready = True
+        return total
+
+    def _fill(self, connection):
+        statement = text(f'INSERT INTO {self.table} (rowid, title, body) VALUES (:rowid, :title, :body)')
+        batch, total = [], 0
+        for rowid, title, body in self.index.iter_documents(connection):
+            batch.append({'rowid': rowid, 'title': title, 'body': body})
+            if len(batch) >= 2000:
+                connection.execute(statement, batch)
+                total += len(batch)
+                batch.clear()
+        if batch:
+            connection.execute(statement, batch)
+            total += len(batch)
+        return total
+
+    def apply(self, changes, connection):
+        if not self._ensure(connection):
+            return # create() and rebuild() index everything committed by then
+        rowids = list(changes)
+        for start in range(0, len(rowids), 500):
+            chunk = rowids[start:start + 500]
+            connection.execute(text(
+                f'DELETE FROM {self.table} WHERE rowid IN ({", ".join(str(int(r)) for r in chunk)})'))
+        rows = [{'rowid': r, 'title': doc[0], 'body': doc[1]} for r, doc in changes.items() if doc is not None]
+        if rows:
+            connection.execute(text(f'INSERT INTO {self.table} (rowid, title, body) VALUES (:rowid, :title, :body)'), rows)
+
+    def rebuild(self):
+        self._ready = False
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(f'DROP TABLE IF EXISTS {self.table}')
+            total = self._create(connection)
+            connection.exec_driver_sql(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+        self._ready = True
+        return total
+
+    def search(self, terms, prefix, positions, limit):
+        match = ' '.join(f'"{t}"' for t in terms) + ('*' if prefix else '')
+        where = f'{self.table} MATCH :match'
+        if positions:
+            where += f' AND rowid % {KIND_SLOTS} IN ({", ".join(str(p) for p in positions)})'
+        # rank MATCH sets the bm25 weights for this query; ORDER BY rank lets
+        # FTS5 sort every match itself and compute snippets for returned rows only
+        params = {'match': match, 'rank': f'bm25({float(self.index.title_weight)}, 1.0)', 'limit': limit}
+        with self.engine.begin() as connection:
+            if not self._ensure(connection):
+                return []
+            rows = connection.execute(text(
+                f'SELECT rowid, title, '
+                f"snippet({self.table}, 1, '{_MARK_OPEN}', '{_MARK_CLOSE}', '…', {SNIPPET_TOKENS}) AS snippet, "
+                f'rank AS score '
+                f'FROM {self.table} WHERE {where} AND rank MATCH :rank ORDER BY rank LIMIT :limit'
+            ), params).all()
+        return [SearchHit(*self.index.decode(rowid), title, _snippet_markup(excerpt), -score)
+                for rowid, title, excerpt, score in rows]
+
+
+class MemoryBackend:
+    """Per-process inverted index used where FTS5 is unavailable.
+
+    Built from the database on first use and updated after each commit made in
+    this process; writes made by other processes appear after :meth:`rebuild`.
+    """
+
+    transactional = False
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, index):
+        self.index = index
+        self._postings = {} # term -> {rowid: title-weighted term frequency}
+        self._documents = {} # rowid -> (length, terms, title, body)
+        self._total_length = 0
+        self._sorted_terms = None
+        self._built = False
+        self._lock = threading.RLock()
+
+    def create(self):
+        return None # Built from the database on first search
+
+    def rebuild(self):
+        with self.index._db.engine.connect() as connection:
+            documents = list(self.index.iter_documents(connection))
+        with self._lock:
+            self._postings, self._documents, self._total_length = {}, {}, 0
+            for rowid, title, body in documents:
+                self._add(rowid, title, body)
+            self._sorted_terms = None
+            self._built = True
+        return len(documents)
+
+    def apply(self, changes, connection=None):
+        with self._lock:
+            if not self._built:
+                return
+            for rowid, document in changes.items():
+                self._remove(rowid)
+                if document is not None:
+                    self._add(rowid, *document)
+            self._sorted_terms = None
+
+    def _add(self, rowid, title, body):
+        weights = {}
+        title_terms, body_terms = tokenize(title), tokenize(body)
+        for term in title_terms:
+            weights[term] = weights.get(term, 0.0) + self.index.title_weight
+        for term in body_terms:
+            weights[term] = weights.get(term, 0.0) + 1.0
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[rowid] = weight
+        length = len(title_terms) + len(body_terms)
+        self._documents[rowid] = (length, tuple(weights), title, body)
+        self._total_length += length
+
+    def _remove(self, rowid):
+        document = self._documents.pop(rowid, None)
+        if document is None:
+            return
+        length, terms = document[0], document[1]
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            del postings[rowid]
+            if not postings:
+                del self._postings[term]
+
+    def _matching(self, term, prefix):
+        if not prefix:
+            return self._postings.get(term, {})
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        merged = {}
+        start = bisect_left(self._sorted_terms, term)
+        for candidate in self._sorted_terms[start:]:
+            if not candidate.startswith(term):
+                break
+            for rowid, weight in self._postings[candidate].items():
+                merged[rowid] = merged.get(rowid, 0.0) + weight
+        return merged
+
+    def search(self, terms, prefix, positions, limit):
+        if not self._built:
+            self.rebuild()
+        with self._lock:
+            postings = [self._matching(t, prefix and i == len(terms) - 1) for i, t in enumerate(terms)]
+            if not all(postings):
+                return []
+            count = len(self._documents)
+            average = self._total_length / count or 1.0
+            candidates = set(min(postings, key=len))
+            for matches in postings:
+                candidates.intersection_update(matches)
+            if positions:
+                candidates = {r for r in candidates if r % KIND_SLOTS in positions}
+            scored = []
+            for rowid in candidates:
+                length = self._documents[rowid][0]
+                score = 0.0
+                for matches in postings:
+                    frequency = matches[rowid]
+                    idf = max(math.log((count - len(matches) + 0.5) / (len(matches) + 0.5)), 1e-6)
+                    score += idf * frequency * (self.k1 + 1) / (
+                        frequency + self.k1 * (1 - self.b + self.b * length / average))
+                scored.append((score, rowid))
+            hits = []
+            for score, rowid in heapq.nlargest(limit, scored):
+                _, _, title, body = self._documents[rowid]
+                hits.append(SearchHit(*self.index.decode(rowid), title, snippet(body, terms, prefix), score))
+            return hits
+
+
+def snippet(body, terms, prefix):
+    """Mark query terms in a window of ``body`` around the first match."""
+    tokens = list(_TOKEN.finditer(body))
+    last = len(terms) - 1
+
+    def matches(token):
+        folded = fold(token.group())
+        return any(folded == t or (prefix and i == last and folded.startswith(t)) for i, t in enumerate(terms))
+
+    first = next((i for i, token in enumerate(tokens) if matches(token)), 0)
+    start = max(0, first - SNIPPET_TOKENS // 3)
+    window = tokens[start:start + SNIPPET_TOKENS]
+    if not window:
+        return Markup('')
+    parts, position = [], window[0].start()
+    for token in window:
+        parts.append(escape(body[position:token.start()]))
+        word = escape(token.group())
+        parts.append(Markup('<mark>%s</mark>') % word if matches(token) else word)
+        position = token.end()
+    return Markup('…' if start else '') + Markup('').join(parts) + Markup('…' if start + SNIPPET_TOKENS < len(tokens) else '')
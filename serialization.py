@@ -0,0 +1,105 @@
+"""Fast, field-selected JSON shapes for catalog snapshots and result rows.
+
+Catalog snapshots and SQL result rows are tuples, so a :class:`Shape` turns a
+field selection into tuple positions once and caches the resulting function:
+serializing an item is then an ``itemgetter`` call and ``dict(zip(...))``
+instead of walking attributes or calling ``_asdict()`` per object.
+:func:`ndjson` encodes a stream of dicts as newline-delimited JSON in
+chunks, for responses too large to build in memory.
+"""
+import json
+from operator import itemgetter
+
+
+class Shape:
+    """The public fields of one tuple type, in output order.
+
+    ``source_fields`` is the tuple's field order (e.g. a namedtuple's
+    ``_fields``) and ``public`` the subset clients may see. ``converters``
+    maps field names to functions applied to non-null values on output, e.g.
+    ``datetime.isoformat``.
+    """
+
+    def __init__(self, name, source_fields, public, converters=None):
+        missing = sorted(set(public) - set(source_fields))
+        if missing:
+            raise ValueError(f'{name} has no fields {", ".join(missing)}')
+        self.name = name
+        self.source_fields = tuple(source_fields)
+        self.public = tuple(public)
+        self.converters = dict(converters or {})
+        self._serializers = {}
+
+    def fields(self, requested=None):
+        """Normalize a selection (comma-separated string or iterable) to public order.
+
+        An empty selection means every public field; unknown names raise
+        ``ValueError``.
+        """
+        if isinstance(requested, str):
+            requested = [name.strip() for name in requested.split(',') if name.strip()]
+        if not requested:
+            return self.public
+        unknown = sorted(set(requested) - set(self.public))
+        if unknown:
+            raise ValueError(f'Unknown {self.name} fields: {", ".join(unknown)}.')
+        requested = set(requested)
+        return tuple(name for name in self.public if name in requested)
+
+    def serializer(self, fields=None, rows=False, tag=None):
+        """A function turning one item into a dict of ``fields`` (default: every public field).
+
+        Items are source tuples, or with ``rows=True`` tuples holding exactly
+        ``fields`` in order (e.g. rows of ``select(*columns)``). ``tag`` adds a
+        constant ``"type"`` entry, for streams mixing several shapes.
+        """
+        fields = self.fields(fields)
+        key = (fields, rows, tag)
+        serialize = self._serializers.get(key)
+        if serialize is None:
+            serialize = self._serializers[key] = self._compile(fields, rows, tag)
+        return serialize
+
+    def _compile(self, fields, rows, tag):
+        if rows:
+            getter = tuple
+        elif len(fields) == 1:
+            position = self.source_fields.index(fields[0])
+            getter = lambda item: (item[position],)
+        else:
+            getter = itemgetter(*(self.source_fields.index(name) for name in fields))
+        if tag: # Leads every object, so stream readers can dispatch before the rest
+            keys, fetch = ('type',) + fields, lambda item: (tag, *getter(item))
+        else:
+            keys, fetch = fields, getter
+        converters = [(i, self.converters[name]) for i, name in enumerate(keys) if name in self.converters]
+
+        if not converters:
+            if rows and not tag:
+                return lambda item: dict(zip(keys, item))
+            return lambda item: dict(zip(keys, fetch(item)))
+
+        def serialize(item):
+            values = list(fetch(item))
+            for i, convert in converters:
+                if values[i] is not None:
+                    values[i] = convert(values[i])
+            return dict(zip(keys, values))
+        return serialize
+
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=str).encode
+
+
+def ndjson(items, lines_per_chunk=500):
+    """Yield ``items`` (dicts) as newline-delimited JSON, ``lines_per_chunk`` lines per string."""
+    chunk = []
+    for item in items:
+        chunk.append(_encode(item))
+        if len(chunk) >= lines_per_chunk:
+            chunk.append('')
+            yield '\n'.join(chunk)
+            chunk = []
+    if chunk:
+        chunk.append('')
+        yield '\n'.join(chunk)
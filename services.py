@@ -0,0 +1,211 @@
+"""Progress, quiz attempt and enrollment logic shared by views, API and commands."""
+import datetime
+
+from sqlalchemy import bindparam, case, insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from extensions import attempt_writer, catalog, db, identity_cache, review_scheduler
+from models import QuizAttempt, User, UserProgress, enrollments
+
+# --- Progress Aggregates ---
+PROGRESS_SCOPES = ('quiz', 'lesson', 'module', 'course')
+QUIZ_ATTEMPT_COLUMNS = ('user_id', 'quiz_id', 'selected_answer', 'is_correct', 'attempted_at')
+
+def apply_progress(rows):
+    """Fold a batch of recorded attempts into the UserProgress aggregates.
+
+    Each row carries the quiz's lesson_id, module_id and course_id, so the
+    batch reduces to one counter delta per (user, scope, scope_id), added to
+    the stored row by INSERT ... ON CONFLICT DO UPDATE; concurrent batches
+    creating the same row both land instead of one failing on the primary key.
+    A quiz counts as solved in its lesson, module and course only for the
+    batch whose conditional UPDATE flips the quiz row's quizzes_solved from 0
+    to 1, so two batches with the same first correct answer count it once.
+    """
+    user_ids = {row['user_id'] for row in rows}
+    quiz_ids = {row['quiz_id'] for row in rows}
+    # Per-column IN lists keep the lookup on the primary key (SQLite scans the
+    # table for row-value IN); the few extra combinations never match below.
+    # Quizzes solved before this batch need no conditional UPDATE.
+    solved = set(db.session.execute(
+        select(UserProgress.user_id, UserProgress.scope_id).where(
+            UserProgress.user_id.in_(user_ids),
+            UserProgress.scope == 'quiz',
+            UserProgress.scope_id.in_(quiz_ids),
+            UserProgress.quizzes_solved > 0,
+        )
+    ).tuples())
+    deltas, parents = {}, {}
+    for row in rows:
+        quiz_key = (row['user_id'], row['quiz_id'])
+        if row['is_correct'] and quiz_key not in solved:
+            parents[quiz_key] = [(row['user_id'], scope, row[f'{scope}_id']) for scope in PROGRESS_SCOPES[1:]]
+        for scope in PROGRESS_SCOPES:
+            key = (row['user_id'], scope, row[f'{scope}_id'])
+            attempts, correct, last = deltas.get(key, (0, 0, row['attempted_at']))
+            deltas[key] = (attempts + 1, correct + int(row['is_correct']), max(last, row['attempted_at']))
+    if not deltas:
+        return
+
+    def add_counts(new):
+        last = UserProgress.last_activity_at
+        return {
+            'attempts': UserProgress.attempts + new.attempts,
+            'correct_answers': UserProgress.correct_answers + new.correct_answers,
+            'last_activity_at': case((last.is_(None) | (last < new.last_activity_at), new.last_activity_at),
+                                     else_=last),
+        }
+
+    statement = insert_or_update(UserProgress.__table__, ('user_id', 'scope', 'scope_id'), add_counts)
+    db.session.execute(statement, [
+        {'user_id': user_id, 'scope': scope, 'scope_id': scope_id, 'attempts': attempts,
+         'correct_answers': correct, 'quizzes_solved': 0, 'last_activity_at': last}
+        for (user_id, scope, scope_id), (attempts, correct, last) in deltas.items()
+    ])
+
+    # The row lock taken by the first UPDATE makes a concurrent one re-read
+    # quizzes_solved = 1 and match nothing
+    progress = UserProgress.__table__
+    solve = (
+        update(progress)
+        .where(progress.c.user_id == bindparam('u'), progress.c.scope == 'quiz',
+               progress.c.scope_id == bindparam('q'), progress.c.quizzes_solved == 0)
+        .values(quizzes_solved=1)
+    )
+    newly_solved = {}
+    for (user_id, quiz_id), keys in parents.items():
+        if db.session.execute(solve, {'u': user_id, 'q': quiz_id}).rowcount:
+            for key in keys:
+                newly_solved[key] = newly_solved.get(key, 0) + 1
+    if newly_solved:
+        db.session.execute(
+            update(progress)
+            .where(progress.c.user_id == bindparam('u'), progress.c.scope == bindparam('s'),
+                   progress.c.scope_id == bindparam('i'))
+            .values(quizzes_solved=progress.c.quizzes_solved + bindparam('n')),
+            [{'u': u, 's': scope, 'i': i, 'n': n} for (u, scope, i), n in newly_solved.items()],
+        )
+
+
+def course_progress(user_id, course_ids=None):
+    """Per-course completion for a user, keyed by course id."""
+    query = UserProgress.query.filter_by(user_id=user_id, scope='course')
+    if course_ids is not None:
+        query = query.filter(UserProgress.scope_id.in_(course_ids))
+    progress = {}
+    for row in query:
+        course = catalog.course(row.scope_id)
+        if course is None:
+            continue
+        percent = min(100, round(100 * row.quizzes_solved / course.quiz_count)) if course.quiz_count else 0
+        progress[course.id] = {
+            'course': course,
+            'attempts': row.attempts,
+            'correct_answers': row.correct_answers,
+            'percent': percent,
+            'last_activity_at': row.last_activity_at,
+        }
+    return progress
+
+# --- Quiz Attempts ---
+def persist_quiz_attempts(rows):
+    # One multi-row INSERT per batch instead of a commit per answer, with the
+    # progress aggregates updated in the same transaction
+    db.session.execute(insert(QuizAttempt), [{key: row[key] for key in QUIZ_ATTEMPT_COLUMNS} for row in rows])
+    apply_progress(rows)
+    review_scheduler.apply(rows)
+    db.session.commit()
+
+def quiz_attempt_row(context, user_id, selected_answer, is_correct, attempted_at=None):
+    # The lesson/module/course ids let apply_progress() update every aggregate without lookups
+    return {
+        'user_id': user_id,
+        'quiz_id': context.quiz.id,
+        'selected_answer': selected_answer,
+        'is_correct': is_correct,
+        'attempted_at': attempted_at or datetime.datetime.utcnow(),
+        'lesson_id': context.lesson.id,
+        'module_id': context.module.id,
+        'course_id': context.course.id,
+    }
+
+def grade_answers(user_id, answers, contexts=None):
+    """Grade ``{quiz_id: answer}`` with the cached checkers and record the attempts as one batch.
+
+    ``contexts`` optionally maps quiz ids to :class:`QuizContext` already at
+    hand (e.g. every quiz of one lesson); otherwise each quiz is looked up in
+    the catalog. Blank answers are skipped. Returns ``(context, answer,
+    is_correct)`` per graded quiz; raises ``KeyError`` listing unknown quiz
+    ids before recording anything.
+    """
+    if contexts is None:
+        contexts = {quiz_id: catalog.quiz(quiz_id) for quiz_id in answers}
+    contexts = {quiz_id: contexts.get(quiz_id) for quiz_id in answers}
+    unknown = sorted(quiz_id for quiz_id, context in contexts.items() if context is None)
+    if unknown:
+        raise KeyError(unknown)
+    attempted_at = datetime.datetime.utcnow()
+    graded = [(contexts[quiz_id], answer, contexts[quiz_id].quiz.checker.grade(answer))
+              for quiz_id, answer in answers.items() if answer and answer.strip()]
+    if graded:
+        attempt_writer.submit([quiz_attempt_row(context, user_id, answer, is_correct, attempted_at)
+                               for context, answer, is_correct in graded])
+    return graded
+
+# --- Enrollment ---
+ENROLLMENT_CHUNK_SIZE = 5000 # Rows per INSERT; keeps SQLite under its bound-parameter limit
+
+def insert_ignoring_duplicates(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return insert(table).prefix_with('IGNORE') # MySQL
+
+def insert_or_update(table, keys, update):
+    """An INSERT that updates the conflicting row instead of failing on it.
+
+    ``keys`` names the unique columns; ``update(new)`` returns the column
+    assignments, where ``new`` refers to the values the INSERT proposed.
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        statement = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        return statement.on_conflict_do_update(index_elements=keys, set_=update(statement.excluded))
+    statement = mysql.insert(table)
+    return statement.on_duplicate_key_update(update(statement.inserted))
+
+def enroll_users(user_ids, course_ids):
+    """Enroll every user in every course with multi-row INSERT ... ON CONFLICT DO NOTHING.
+
+    Existing enrollments are left untouched. Commits and returns the number of
+    new enrollments.
+    """
+    pairs = [{'user_id': u, 'course_id': c} for u in dict.fromkeys(user_ids) for c in dict.fromkeys(course_ids)]
+    enrolled = 0
+    for start in range(0, len(pairs), ENROLLMENT_CHUNK_SIZE):
+        statement = insert_ignoring_duplicates(enrollments).values(pairs[start:start + ENROLLMENT_CHUNK_SIZE])
+        enrolled += db.session.execute(statement).rowcount
+    db.session.commit()
+    if len(user_ids) > 1000:
+        identity_cache.invalidate()
+    else:
+        for user_id in user_ids:
+            identity_cache.invalidate(user_id)
+    return enrolled
+
+def resolve_user_ids(identifiers):
+    """Map a mix of user ids and emails to existing user ids, preserving order."""
+    ids = {int(i) for i in identifiers if isinstance(i, int) or str(i).isdigit()}
+    emails = {str(i).strip().lower() for i in identifiers if not (isinstance(i, int) or str(i).isdigit())}
+    found = []
+    for chunk in _chunks(list(ids), ENROLLMENT_CHUNK_SIZE):
+        found.extend(db.session.execute(select(User.id).where(User.id.in_(chunk))).scalars())
+    for chunk in _chunks(list(emails), ENROLLMENT_CHUNK_SIZE):
+        found.extend(db.session.execute(select(User.id).where(db.func.lower(User.email).in_(chunk))).scalars())
+    return sorted(set(found))
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,213 @@
+"""Spaced-repetition review scheduling from quiz attempt history.
+
+Every (user, quiz) pair a learner has attempted carries a small memory state
+(ease, interval, repetition and lapse counts) and the time the quiz is next
+due. States are stored with an index on ``(user_id, due_at)``, so "what should
+I review now" is one index range scan however many items or attempts the
+user has.
+
+Scheduling is SM-2 adapted to pass/fail answers: a correct answer on or after
+the due time grows the interval (1 day, 6 days, then by the ease factor), a
+wrong answer resets it and lowers the ease, and a correct answer before the
+item is due is practice that leaves the schedule alone.
+
+:meth:`ReviewScheduler.apply` folds newly recorded attempts into the stored
+states inside the caller's transaction. :meth:`ReviewScheduler.rebuild`
+recomputes every state from the full attempt history, replaying ranges of
+users in parallel worker processes.
+"""
+import datetime
+import math
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, repeat
+
+from sqlalchemy import Boolean, DateTime, Integer, column, create_engine, delete, func, insert, select, table
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+LAPSE_EASE_PENALTY = 0.2
+FIRST_INTERVAL_DAYS = 1.0
+SECOND_INTERVAL_DAYS = 6.0
+
+MemoryState = namedtuple('MemoryState', [
+    'ease', 'interval_days', 'repetitions', 'lapses', 'due_at', 'last_reviewed_at',
+])
+NEW_STATE = MemoryState(INITIAL_EASE, 0.0, 0, 0, None, None)
+STATE_COLUMNS = ('user_id', 'quiz_id') + MemoryState._fields
+
+
+def review(state, is_correct, reviewed_at):
+    """Return the :class:`MemoryState` after one graded attempt."""
+    state = state or NEW_STATE
+    if is_correct and state.due_at is not None and reviewed_at < state.due_at:
+        return state._replace(last_reviewed_at=reviewed_at)
+    if is_correct:
+        repetitions, ease, lapses = state.repetitions + 1, state.ease, state.lapses
+        if repetitions == 1:
+            interval = FIRST_INTERVAL_DAYS
+        elif repetitions == 2:
+            interval = SECOND_INTERVAL_DAYS
+        else:
+            interval = state.interval_days * ease
+    else:
+        repetitions, interval, lapses = 0, FIRST_INTERVAL_DAYS, state.lapses + 1
+        ease = max(MIN_EASE, state.ease - LAPSE_EASE_PENALTY)
+    return MemoryState(ease, interval, repetitions, lapses,
+                       reviewed_at + datetime.timedelta(days=interval), reviewed_at)
+
+
+def replay(attempts):
+    """Fold ``(is_correct, attempted_at)`` pairs, oldest first, into one state."""
+    state = None
+    for is_correct, attempted_at in attempts:
+        state = review(state, is_correct, attempted_at)
+    return state
+
+
+class ReviewScheduler:
+    """Keeps the review-state table in step with recorded quiz attempts.
+
+    Call :meth:`init_app` with the attempt and state models; it reads
+    ``REVIEW_REBUILD_WORKERS`` (0 replays in-process) and
+    ``REVIEW_REBUILD_BATCH_SIZE`` from the app config.
+    """
+
+    def __init__(self, workers=0, batch_size=5000):
+        self.workers = workers
+        self.batch_size = batch_size
+        self._db = None
+
+    def init_app(self, app, db, attempt_model, state_model):
+        self.workers = app.config.setdefault('REVIEW_REBUILD_WORKERS', self.workers)
+        self.batch_size = app.config.setdefault('REVIEW_REBUILD_BATCH_SIZE', self.batch_size)
+        self._db = db
+        self.Attempt, self.State = attempt_model, state_model
+        app.extensions['review_scheduler'] = self
+
+    # --- Incremental updates ---
+    def apply(self, rows):
+        """Fold recorded attempts into the stored states; the caller commits.
+
+        ``rows`` are mappings with ``user_id``, ``quiz_id``, ``is_correct`` and
+        ``attempted_at``. States are written with INSERT ... ON CONFLICT DO
+        UPDATE, so two batches creating the same (user, quiz) state do not
+        fail; the one written last wins, and :meth:`rebuild` recomputes it
+        exactly from the attempt history.
+        """
+        State, session = self.State, self._db.session
+        keys = {(row['user_id'], row['quiz_id']) for row in rows}
+        if not keys:
+            return
+        # Per-column IN lists keep the lookup on the primary key; extra combinations are dropped
+        candidates = session.execute(select(*(getattr(State, name) for name in STATE_COLUMNS)).where(
+            State.user_id.in_({key[0] for key in keys}),
+            State.quiz_id.in_({key[1] for key in keys}),
+        ))
+        states = {(user_id, quiz_id): MemoryState(*state)
+                  for user_id, quiz_id, *state in candidates if (user_id, quiz_id) in keys}
+        for row in sorted(rows, key=lambda row: row['attempted_at']):
+            key = (row['user_id'], row['quiz_id'])
+            states[key] = review(states.get(key), row['is_correct'], row['attempted_at'])
+        session.execute(self._insert_or_replace(), [dict(zip(STATE_COLUMNS, key + state))
+                                                    for key, state in states.items()])
+
+    def _insert_or_replace(self):
+        table = self.State.__table__
+        dialect = self._db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            statement = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+            return statement.on_conflict_do_update(
+                index_elements=('user_id', 'quiz_id'),
+                set_={field: statement.excluded[field] for field in MemoryState._fields})
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update({field: statement.inserted[field] for field in MemoryState._fields})
+
+    # --- Queries ---
+    def due(self, user_id, limit=20, now=None):
+        """The user's due states, most overdue first, and whether more are due."""
+        State = self.State
+        now = now or datetime.datetime.utcnow()
+        states = self._db.session.scalars(
+            select(State).where(State.user_id == user_id, State.due_at <= now)
+            .order_by(State.due_at).limit(limit + 1)
+        ).all()
+        return states[:limit], len(states) > limit
+
+    def next_due_at(self, user_id):
+        State = self.State
+        return self._db.session.execute(select(func.min(State.due_at)).where(State.user_id == user_id)).scalar()
+
+    # --- Batch rebuild ---
+    def rebuild(self, workers=None, users_per_task=1000):
+        """Recompute every state from the attempt history; returns ``(users, states)``.
+
+        Users are split into contiguous id ranges. Workers only read and
+        replay; this process writes each range in its own transaction, so a
+        range is never visible half rebuilt. With ``workers`` > 0 the database
+        must be reachable by URL from other processes (not in-memory SQLite).
+        """
+        workers = self.workers if workers is None else workers
+        Attempt, State, session = self.Attempt, self.State, self._db.session
+        user_ids = session.scalars(select(Attempt.user_id).distinct().order_by(Attempt.user_id)).all()
+        size = max(1, min(users_per_task, math.ceil(len(user_ids) / (max(workers, 1) * 8))))
+        ranges = [(user_ids[i], user_ids[min(i + size, len(user_ids)) - 1]) for i in range(0, len(user_ids), size)]
+        session.close()
+
+        attempts_table = Attempt.__tablename__
+        if workers:
+            url = self._db.engine.url.render_as_string(hide_password=False)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            results = pool.map(_replay_range, repeat(url), repeat(attempts_table), ranges)
+        else:
+            pool = None
+            results = (_replay_range(self._db.engine, attempts_table, user_range) for user_range in ranges)
+
+        total = 0
+        try:
+            for (low, high), states in zip(ranges, results):
+                session.execute(delete(State).where(State.user_id.between(low, high)))
+                for start in range(0, len(states), self.batch_size):
+                    session.execute(insert(State), [dict(zip(STATE_COLUMNS, s))
+                                                    for s in states[start:start + self.batch_size]])
+                session.commit()
+                total += len(states)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        # Users whose attempts have all been deleted since the last run
+        session.execute(delete(State).where(State.user_id.not_in(select(Attempt.user_id).distinct())))
+        session.commit()
+        return len(user_ids), total
+
+
+_engines = {}
+
+
+def _replay_range(database, attempts_table, user_range):
+    """Replay the attempts of users ``low..high``; returns state rows as tuples.
+
+    Runs in worker processes, so it takes a database URL (or an engine when
+    run in-process) and the attempt table name rather than app objects.
+    """
+    low, high = user_range
+    if isinstance(database, str):
+        if database not in _engines:
+            _engines[database] = create_engine(database)
+        database = _engines[database]
+    attempts = table(attempts_table, column('user_id', Integer), column('quiz_id', Integer),
+                     column('is_correct', Boolean), column('attempted_at', DateTime))
+    statement = (
+        select(attempts.c.user_id, attempts.c.quiz_id, attempts.c.is_correct, attempts.c.attempted_at)
+        .where(attempts.c.user_id.between(low, high), attempts.c.attempted_at.is_not(None))
+        .order_by(attempts.c.user_id, attempts.c.quiz_id, attempts.c.attempted_at)
+    )
+    states = []
+    with database.connect() as connection:
+        rows = connection.execution_options(yield_per=5000).execute(statement)
+        # Ordered like the (user_id, quiz_id, attempted_at) index, so each pair's history is contiguous
+        for key, history in groupby(rows, key=lambda row: (row.user_id, row.quiz_id)):
+            states.append(key + tuple(replay((row.is_correct, row.attempted_at) for row in history)))
+    return states
@@ -0,0 +1,343 @@
+"""Persistent background tasks run by a local pool of worker processes.
+
+Routes call :meth:`TaskQueue.enqueue`, which adds a row to the ``tasks``
+table inside the caller's transaction: a task exists exactly when the change
+that caused it is committed, and the request returns without waiting for it.
+``flask tasks work`` runs :meth:`TaskQueue.work`, which claims due tasks,
+runs them in worker processes and records the outcome. The database is the
+queue; no broker is involved.
+
+- Idempotency: enqueueing with a ``key`` that another task already has is a
+  no-op, so retried requests and double submissions do not run twice.
+- Retries: a failing task is retried with exponential backoff and jitter
+  until it has run ``max_attempts`` times, then left ``failed`` with its error.
+  Exceptions a task type declares ``permanent`` (e.g. invalid input) fail it
+  at once.
+- Concurrency: at most ``concurrency`` tasks of one type run at once across
+  every worker sharing the database (e.g. an SMTP server's connection limit).
+  SQLite serializes claims, so the limit is exact there.
+- Leases: a worker renews the lease on the tasks it is running. If the worker
+  dies, the lease expires and the task becomes due again, so tasks run at
+  least once and must tolerate running twice.
+"""
+import datetime
+import importlib
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+TaskType = namedtuple('TaskType', ['name', 'fn', 'max_attempts', 'concurrency', 'backoff', 'max_backoff',
+                                   'permanent'])
+ClaimedTask = namedtuple('ClaimedTask', ['id', 'name', 'payload', 'attempt', 'max_attempts'])
+Failure = namedtuple('Failure', ['error', 'permanent']) # Formatted traceback; True if retrying cannot help
+
+
+def retry_delay(attempt, backoff, max_backoff):
+    """Seconds to wait before retrying after failed ``attempt`` (1-based): doubling, capped, jittered."""
+    return min(max_backoff, backoff * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+def parse_limits(text):
+    """``'send_email=2,export=1'`` -> ``{'send_email': 2, 'export': 1}``."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, _, value = item.partition('=')
+        limits[name.strip()] = int(value)
+    return limits
+
+
+class TaskQueue:
+    """Registry of task types plus the enqueue, claim and worker loop over a task model.
+
+    Register task functions with :meth:`task`; call :meth:`init_app` with the
+    ``Task`` model. Reads ``TASK_WORKERS``, ``TASK_POLL_INTERVAL``,
+    ``TASK_LEASE_SECONDS`` and ``TASK_CONCURRENCY`` (per-type overrides such
+    as ``'send_email=2'``) from the app config.
+    """
+
+    def __init__(self, workers=0, poll_interval=1.0, lease=60):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.concurrency_limits = {}
+        self.types = {}
+        self._db = None
+        self.Task = None
+
+    def init_app(self, app, db, task_model, modules=()):
+        """Bind to ``task_model`` and import ``modules``, which register task types."""
+        self.workers = app.config.setdefault('TASK_WORKERS', self.workers)
+        self.poll_interval = app.config.setdefault('TASK_POLL_INTERVAL', self.poll_interval)
+        self.lease = app.config.setdefault('TASK_LEASE_SECONDS', self.lease)
+        self.concurrency_limits = parse_limits(app.config.setdefault('TASK_CONCURRENCY', ''))
+        self._db = db
+        self.Task = task_model
+        for name in modules:
+            importlib.import_module(name)
+        app.extensions['task_queue'] = self
+
+    def task(self, name, max_attempts=5, concurrency=None, backoff=30, max_backoff=3600, permanent=()):
+        """Register ``fn(**payload)`` as task type ``name``.
+
+        ``concurrency`` caps how many run at once (None: no cap); ``backoff``
+        is the first retry delay in seconds, doubled per attempt up to
+        ``max_backoff``. Exceptions of the ``permanent`` types fail the task
+        without retrying.
+        """
+        def decorator(fn):
+            self.types[name] = TaskType(name, fn, max_attempts, concurrency, backoff, max_backoff, tuple(permanent))
+            return fn
+        return decorator
+
+    def concurrency(self, name):
+        return self.concurrency_limits.get(name, self.types[name].concurrency)
+
+    # --- Enqueueing ---
+    def enqueue(self, name, payload=None, key=None, delay=0):
+        """Add a task to the current session's transaction; the caller commits.
+
+        ``payload`` must be JSON-serializable and is passed to the task as
+        keyword arguments. Returns False, adding nothing, if ``key`` is already
+        taken by a task in any state.
+        """
+        if name not in self.types:
+            raise ValueError(f'Unknown task type {name!r}')
+        now = _utcnow()
+        statement = self._insert_ignoring_duplicates().values(
+            name=name, payload=payload or {}, status=QUEUED, attempts=0,
+            max_attempts=self.types[name].max_attempts, idempotency_key=key,
+            run_at=now + datetime.timedelta(seconds=delay), created_at=now,
+        )
+        return self._db.session.execute(statement).rowcount == 1
+
+    def _insert_ignoring_duplicates(self):
+        table = self.Task.__table__
+        dialect = self._db.session.get_bind().dialect.name
+        if dialect == 'sqlite':
+            return sqlite.insert(table).on_conflict_do_nothing()
+        if dialect == 'postgresql':
+            return postgresql.insert(table).on_conflict_do_nothing()
+        return insert(table).prefix_with('IGNORE') # MySQL
+
+    # --- Inspection and maintenance ---
+    def counts(self):
+        """``{(name, status): count}`` over every stored task."""
+        Task = self.Task
+        rows = self._db.session.execute(
+            select(Task.name, Task.status, func.count()).group_by(Task.name, Task.status))
+        return {(name, status): count for name, status, count in rows}
+
+    def retry_failed(self, name=None):
+        """Queue failed tasks (of type ``name``, or all) again with fresh attempts; returns how many."""
+        Task = self.Task
+        statement = update(Task).where(Task.status == FAILED).values(
+            status=QUEUED, attempts=0, run_at=_utcnow(), finished_at=None)
+        if name:
+            statement = statement.where(Task.name == name)
+        count = self._db.session.execute(statement).rowcount
+        self._db.session.commit()
+        return count
+
+    def purge(self, older_than):
+        """Delete done and failed tasks that finished before ``older_than``; their keys become reusable."""
+        Task = self.Task
+        count = self._db.session.execute(
+            delete(Task).where(Task.status.in_((DONE, FAILED)), Task.finished_at < older_than)).rowcount
+        self._db.session.commit()
+        return count
+
+    # --- Claiming ---
+    def _claim(self, worker_id, slots):
+        """Lease up to ``slots`` due tasks to ``worker_id``, honouring per-type limits."""
+        Task, session = self.Task, self._db.session
+        now = _utcnow()
+        # Writing first takes SQLite's write lock, so claims by other workers wait for this one
+        self._expire_leases(now)
+        running = Counter(dict(session.execute(
+            select(Task.name, func.count()).where(Task.status == RUNNING).group_by(Task.name)).all()))
+        saturated = [name for name in self.types
+                     if self.concurrency(name) is not None and running[name] >= self.concurrency(name)]
+        candidates = session.execute(
+            select(Task.id, Task.name, Task.payload, Task.attempts, Task.max_attempts)
+            .where(Task.status == QUEUED, Task.run_at <= now,
+                   Task.name.in_(set(self.types) - set(saturated))) # Types from other releases are left alone
+            .order_by(Task.run_at, Task.id)
+            .limit(slots * 4)
+        ).all()
+
+        claimed = []
+        for row in candidates:
+            limit = self.concurrency(row.name)
+            if limit is not None and running[row.name] >= limit:
+                continue
+            won = session.execute(
+                update(Task).where(Task.id == row.id, Task.status == QUEUED).values(
+                    status=RUNNING, attempts=Task.attempts + 1, locked_by=worker_id,
+                    locked_until=now + datetime.timedelta(seconds=self.lease))
+            ).rowcount
+            if won:
+                running[row.name] += 1
+                claimed.append(ClaimedTask(row.id, row.name, row.payload, row.attempts + 1, row.max_attempts))
+                if len(claimed) == slots:
+                    break
+        session.commit()
+        return claimed
+
+    def _expire_leases(self, now):
+        # Tasks whose worker died: retried like any failure, unless out of attempts
+        Task, session = self.Task, self._db.session
+        expired = (Task.status == RUNNING, Task.locked_until <= now)
+        session.execute(update(Task).where(*expired, Task.attempts >= Task.max_attempts).values(
+            status=FAILED, finished_at=now, locked_by=None, locked_until=None,
+            last_error='Lease expired: the worker stopped while running the task.'))
+        session.execute(update(Task).where(*expired).values(
+            status=QUEUED, run_at=now, locked_by=None, locked_until=None))
+
+    def _renew(self, worker_id, task_ids):
+        Task = self.Task
+        self._db.session.execute(
+            update(Task).where(Task.id.in_(task_ids), Task.locked_by == worker_id)
+            .values(locked_until=_utcnow() + datetime.timedelta(seconds=self.lease)))
+        self._db.session.commit()
+
+    def _finish(self, worker_id, task, failure):
+        """Record the outcome of ``task``; returns ``'done'``, ``'retried'`` or ``'failed'``."""
+        Task = self.Task
+        now = _utcnow()
+        error = failure and failure.error
+        if failure is None:
+            outcome, values = 'done', {'status': DONE, 'finished_at': now, 'last_error': None}
+        elif failure.permanent:
+            outcome, values = 'failed', {'status': FAILED, 'finished_at': now, 'last_error': error}
+            logger.error('Task %s #%d failed permanently: %s', task.name, task.id, error)
+        elif task.attempt >= task.max_attempts:
+            outcome, values = 'failed', {'status': FAILED, 'finished_at': now, 'last_error': error}
+            logger.error('Task %s #%d failed after %d attempts: %s', task.name, task.id, task.attempt, error)
+        else:
+            spec = self.types[task.name]
+            delay = retry_delay(task.attempt, spec.backoff, spec.max_backoff)
+            outcome, values = 'retried', {'status': QUEUED, 'last_error': error,
+                                          'run_at': now + datetime.timedelta(seconds=delay)}
+            logger.warning('Task %s #%d failed (attempt %d of %d), retrying in %.0fs: %s',
+                           task.name, task.id, task.attempt, task.max_attempts, delay, error.strip().splitlines()[-1])
+        # A worker whose lease expired meanwhile no longer owns the task
+        self._db.session.execute(update(Task).where(Task.id == task.id, Task.locked_by == worker_id)
+                                 .values(locked_by=None, locked_until=None, **values))
+        self._db.session.commit()
+        return outcome
+
+    # --- Worker ---
+    def work(self, app_factory=None, workers=None, burst=False):
+        """Run tasks until SIGINT/SIGTERM, or with ``burst`` until none are due; returns outcome counts.
+
+        Call inside an app context. With ``workers`` > 0 (default
+        ``TASK_WORKERS``) tasks run in that many processes, each building its
+        app with the picklable ``app_factory``; with 0 they run one at a time
+        in this process. Stopping waits for the running tasks to finish.
+        """
+        workers = self.workers if workers is None else workers
+        app = current_app._get_current_object()
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        outcomes = Counter()
+        stopping = []
+        previous_handlers = {sig: signal.signal(sig, lambda *_: stopping.append(True))
+                             for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            if not workers:
+                while not stopping:
+                    claimed = self._claim(worker_id, 1)
+                    for task in claimed:
+                        outcomes[self._finish(worker_id, task, _execute(app, task.name, task.payload))] += 1
+                    if not claimed:
+                        if burst:
+                            break
+                        time.sleep(self.poll_interval)
+                return outcomes
+
+            pool = _worker_pool(workers, app_factory)
+            running = {}
+            renewed = time.monotonic()
+            try:
+                while True:
+                    claimed = []
+                    if not stopping and len(running) < workers:
+                        claimed = self._claim(worker_id, workers - len(running))
+                        for task in claimed:
+                            running[pool.submit(_run_task, task.name, task.payload)] = task
+                    if not running:
+                        if stopping or (burst and not claimed):
+                            break
+                        if not claimed:
+                            time.sleep(self.poll_interval)
+                        continue
+                    finished, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    broken = False
+                    for future in finished:
+                        task = running.pop(future)
+                        try:
+                            failure = future.result()
+                        except BrokenProcessPool:
+                            broken, failure = True, Failure('The worker process running the task exited.', False)
+                        outcomes[self._finish(worker_id, task, failure)] += 1
+                    if broken: # Every task left in a broken pool fails with it
+                        pool.shutdown(wait=False)
+                        pool = _worker_pool(workers, app_factory)
+                    if running and time.monotonic() - renewed > self.lease / 3:
+                        self._renew(worker_id, [task.id for task in running.values()])
+                        renewed = time.monotonic()
+            finally:
+                pool.shutdown(cancel_futures=True)
+            return outcomes
+        finally:
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+def _worker_pool(workers, app_factory):
+    # 'spawn' keeps children free of the parent's connections and locks
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_start_worker, initargs=(app_factory,))
+
+
+_worker_app = None
+
+
+def _start_worker(app_factory):
+    global _worker_app
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # The parent stops on Ctrl-C once running tasks finish
+    _worker_app = app_factory()
+
+
+def _run_task(name, payload):
+    return _execute(_worker_app, name, payload)
+
+
+def _execute(app, name, payload):
+    """Run one task in a fresh app context; returns None or a :class:`Failure`."""
+    spec = app.extensions['task_queue'].types[name]
+    with app.app_context():
+        try:
+            spec.fn(**payload)
+            return None
+        except Exception as e:
+            return Failure(traceback.format_exc(), isinstance(e, spec.permanent))
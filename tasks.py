@@ -0,0 +1,38 @@
+"""Background task types, run by `flask tasks work` (see :mod:`task_queue`).
+
+Tasks receive their JSON payload as keyword arguments inside an app context.
+They may run more than once (retries, expired leases), so each must be safe
+to repeat; routes pass an idempotency key when a duplicate would be visible.
+Never put secrets such as passwords in a payload: payloads are stored in the
+database until purged.
+"""
+import smtplib
+from email.message import EmailMessage
+
+from flask import current_app
+
+from extensions import task_queue
+
+
+# --- Email ---
+# ValueError means a malformed message (e.g. a line break in a header), which no retry can fix
+@task_queue.task('send_email', max_attempts=8, concurrency=2, backoff=30, max_backoff=3600, permanent=(ValueError,))
+def send_email(to, subject, body, reply_to=None):
+    """Send a plain-text message through ``MAIL_SERVER``, or log it when none is configured."""
+    config = current_app.config
+    message = EmailMessage()
+    message['From'] = config['MAIL_DEFAULT_SENDER']
+    message['To'] = to
+    message['Subject'] = subject
+    if reply_to:
+        message['Reply-To'] = reply_to
+    message.set_content(body)
+    if not config['MAIL_SERVER']:
+        current_app.logger.info('MAIL_SERVER is not set; not sending %r to %s', subject, to)
+        return
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=30) as smtp:
+        if config['MAIL_USE_TLS']:
+            smtp.starttls()
+        if config['MAIL_USERNAME']:
+            smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        smtp.send_message(message)
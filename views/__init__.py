@@ -0,0 +1,48 @@
+"""Blueprints and the helpers their views share.
+
+Blueprint modules are imported by :func:`register_blueprints` while the app is
+built, so importing this package (e.g. for a CLI command or a benchmark) does
+not pull in every view.
+"""
+import datetime
+import functools
+import hmac
+import importlib
+
+from flask import abort, current_app, request
+from flask_login import current_user
+
+from extensions import catalog
+
+# Modules defining a ``bp`` blueprint, registered in this order; the BLUEPRINTS
+# config key can trim the list, e.g. for API-only workers
+BLUEPRINTS = ('views.main', 'views.auth', 'views.courses', 'views.forum', 'views.api')
+
+
+def register_blueprints(app):
+    for name in app.config.setdefault('BLUEPRINTS', BLUEPRINTS):
+        app.register_blueprint(importlib.import_module(name).bp)
+
+
+def admin_token_required(view):
+    # Admin endpoints are disabled unless ADMIN_API_TOKEN is configured
+    @functools.wraps(view)
+    def wrapped(*args, **kwargs):
+        token = current_app.config.get('ADMIN_API_TOKEN')
+        if not token or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapped
+
+
+# --- Conditional Requests ---
+def catalog_etag(key, per_user=True):
+    # ETag inputs for a catalog-backed response; None lets the view 404
+    digest = catalog.digest(key)
+    if digest is None:
+        return None
+    return (digest, current_user.get_id()) if per_user else (digest,)
+
+
+def catalog_last_modified():
+    return datetime.datetime.utcfromtimestamp(catalog.last_modified)
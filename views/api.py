@@ -0,0 +1,252 @@
+import base64
+import datetime
+from itertools import islice
+from operator import attrgetter
+
+from flask import Blueprint, Response, abort, request, stream_with_context
+from flask_login import current_user, login_required
+from sqlalchemy import select
+
+from catalog_cache import CourseSummary, LessonSnapshot, ModuleSnapshot, QuizSnapshot
+from database_profile import read_only
+from extensions import catalog, db, search_index
+from http_caching import conditional
+from models import Course, Lesson, Module, Quiz, QuizAttemptDaily, UserProgress
+from serialization import Shape, ndjson
+from services import PROGRESS_SCOPES, enroll_users, grade_answers, resolve_user_ids
+from views import admin_token_required, catalog_etag, catalog_last_modified
+from views.main import SEARCH_RESULTS_LIMIT, search_request, search_result_url
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+# --- Shapes ---
+# Public fields per resource type; clients pick a subset with fields[<type>]=a,b.
+# Answers (correct_answer, accepted_answers) are never exposed.
+COURSE = Shape('course', CourseSummary._fields,
+               ('id', 'language', 'level', 'title', 'description', 'image_url', 'learning_objectives'))
+MODULE = Shape('module', ModuleSnapshot._fields, ('id', 'course_id', 'order', 'title', 'description'))
+LESSON = Shape('lesson', LessonSnapshot._fields,
+               ('id', 'module_id', 'lesson_number', 'title', 'content', 'video_url', 'estimated_duration'))
+QUIZ = Shape('quiz', QuizSnapshot._fields, ('id', 'lesson_id', 'question', 'options', 'quiz_type'))
+PROGRESS_FIELDS = ('scope_id', 'attempts', 'correct_answers', 'quizzes_solved', 'last_activity_at')
+PROGRESS = Shape('progress', PROGRESS_FIELDS, PROGRESS_FIELDS,
+                 converters={'last_activity_at': datetime.datetime.isoformat})
+
+# Types streamed by /api/catalog/export, parents first
+EXPORT_TYPES = {'course': (COURSE, Course), 'module': (MODULE, Module), 'lesson': (LESSON, Lesson), 'quiz': (QUIZ, Quiz)}
+EXPORT_BATCH_SIZE = 1000 # Rows fetched, and NDJSON lines sent, per chunk
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+@bp.errorhandler(400)
+def bad_request(e):
+    return {'error': e.description}, 400
+
+def selected_fields(shape):
+    try:
+        return shape.fields(request.args.get(f'fields[{shape.name}]'))
+    except ValueError as e:
+        abort(400, str(e))
+
+def page_size():
+    return max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+# Listings page on the id of their last item, like the forum's (created_at, id) cursors
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode('ascii')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii'))
+    except ValueError: # Also covers malformed base64
+        abort(400, 'Invalid cursor.')
+
+def catalog_query_etag(key):
+    # The catalog digest plus the query string: fields, filters and cursors change the body
+    parts = catalog_etag(key, per_user=False)
+    return None if parts is None else (*parts, request.query_string)
+
+@bp.route('/languages')
+@read_only
+@conditional(lambda: catalog_etag('languages', per_user=False),
+             cache_control='public, max-age=300', last_modified=catalog_last_modified)
+def languages():
+    return {'languages': [{'name': language, 'levels': list(levels)} for language, levels in catalog.languages()]}
+
+@bp.route('/courses')
+@read_only
+@conditional(lambda: catalog_query_etag('courses'),
+             cache_control='public, max-age=60', last_modified=catalog_last_modified)
+def courses():
+    # Query: language, level, fields[course], limit, cursor
+    serialize = COURSE.serializer(selected_fields(COURSE))
+    language = request.args.get('language')
+    level = request.args.get('level')
+    after = decode_cursor(request.args.get('cursor'))
+    limit = page_size()
+    matching = (
+        c for c in sorted(catalog.courses(), key=attrgetter('id'))
+        if (after is None or c.id > after)
+        and (not language or c.language == language.capitalize())
+        and (not level or c.level == level.capitalize())
+    )
+    page = list(islice(matching, limit + 1))
+    next_cursor = encode_cursor(page[limit - 1].id) if len(page) > limit else None
+    return {'courses': [serialize(c) for c in page[:limit]], 'next_cursor': next_cursor}
+
+@bp.route('/courses/<int:course_id>')
+@read_only
+@conditional(lambda course_id: catalog_query_etag(('course', course_id)),
+             cache_control='public, max-age=60', last_modified=catalog_last_modified)
+def course_tree(course_id):
+    # The course with its modules, lessons and quizzes; fields[<type>] applies per level
+    course = catalog.course(course_id)
+    if course is None:
+        abort(404)
+    course_fields, module_fields, lesson_fields, quiz_fields = (
+        selected_fields(shape) for shape in (COURSE, MODULE, LESSON, QUIZ))
+    serialize_module = MODULE.serializer(module_fields)
+    serialize_lesson = LESSON.serializer(lesson_fields)
+    serialize_quiz = QUIZ.serializer(quiz_fields)
+    modules = []
+    for module in course.modules:
+        lessons = []
+        for lesson in module.lessons:
+            item = serialize_lesson(lesson)
+            item['quizzes'] = [serialize_quiz(quiz) for quiz in lesson.quizzes]
+            lessons.append(item)
+        item = serialize_module(module)
+        item['lessons'] = lessons
+        modules.append(item)
+    result = COURSE.serializer(course_fields)(course)
+    result['modules'] = modules
+    return {'course': result}
+
+@bp.route('/progress')
+@login_required
+def progress():
+    # Query: scope (quiz, lesson, module or course), fields[progress], limit, cursor
+    scope = request.args.get('scope', 'course')
+    if scope not in PROGRESS_SCOPES:
+        abort(400, f'scope must be one of {", ".join(PROGRESS_SCOPES)}.')
+    fields = selected_fields(PROGRESS)
+    if 'scope_id' not in fields: # Needed for the cursor; selected first, dropped below if unrequested
+        columns = ('scope_id',) + fields
+    else:
+        columns = fields
+    statement = (
+        select(*(getattr(UserProgress, name) for name in columns))
+        .where(UserProgress.user_id == current_user.id, UserProgress.scope == scope)
+        .order_by(UserProgress.scope_id)
+    )
+    after = decode_cursor(request.args.get('cursor'))
+    if after is not None:
+        statement = statement.where(UserProgress.scope_id > after)
+    limit = page_size()
+    rows = db.session.execute(statement.limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1].scope_id) if len(rows) > limit else None
+    serialize = PROGRESS.serializer(columns, rows=True)
+    items = [serialize(row) for row in rows[:limit]]
+    if columns is not fields:
+        for item in items:
+            del item['scope_id']
+    return {'scope': scope, 'progress': items, 'next_cursor': next_cursor}
+
+@bp.route('/catalog/export')
+@read_only
+@login_required
+def export_catalog():
+    # Newline-delimited JSON, one {"type": ..., <fields>} object per line, streamed in
+    # chunks so memory stays flat however large the catalog. Query: types=course,lesson
+    # (default: all, parents first) and fields[<type>].
+    requested = [name.strip() for name in request.args.get('types', '').split(',') if name.strip()]
+    unknown = sorted(set(requested) - set(EXPORT_TYPES))
+    if unknown:
+        abort(400, f'Unknown types: {", ".join(unknown)}.')
+    types = [name for name in EXPORT_TYPES if not requested or name in requested]
+    selections = [(name, selected_fields(EXPORT_TYPES[name][0])) for name in types]
+
+    def generate():
+        for name, fields in selections:
+            shape, model = EXPORT_TYPES[name]
+            serialize = shape.serializer(fields, rows=True, tag=name)
+            statement = select(*(getattr(model, field) for field in fields)).order_by(model.id)
+            result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            for rows in result.partitions():
+                yield from ndjson(map(serialize, rows), lines_per_chunk=EXPORT_BATCH_SIZE)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@bp.route('/enrollments/bulk', methods=['POST'])
+@admin_token_required
+def bulk_enroll():
+    # Body: {"course_ids": [1, 2], "users": [17, "learner@example.com", ...]}
+    payload = request.get_json(silent=True) or {}
+    course_ids = payload.get('course_ids') or []
+    identifiers = payload.get('users') or []
+    if not course_ids or not identifiers or not all(isinstance(c, int) for c in course_ids):
+        return {'error': 'course_ids (integers) and users are required.'}, 400
+    known_courses = set(db.session.execute(select(Course.id).where(Course.id.in_(course_ids))).scalars())
+    if known_courses != set(course_ids):
+        return {'error': 'Unknown course ids.', 'course_ids': sorted(set(course_ids) - known_courses)}, 400
+    user_ids = resolve_user_ids(identifiers)
+    enrolled = enroll_users(user_ids, course_ids)
+    return {'requested': len(identifiers), 'users_found': len(user_ids), 'enrolled': enrolled}
+
+@bp.route('/quizzes/grade', methods=['POST'])
+@login_required
+def grade_quizzes():
+    # Body: {"answers": {"<quiz id>": "<answer>", ...}}; every answer is recorded as an attempt
+    payload = request.get_json(silent=True) or {}
+    answers = payload.get('answers')
+    if not isinstance(answers, dict) or not all(str(k).isdigit() and isinstance(v, str) for k, v in answers.items()):
+        return {'error': 'Expected {"answers": {"<quiz id>": "<answer>", ...}}.'}, 400
+    try:
+        graded = grade_answers(current_user.id, {int(k): v for k, v in answers.items()})
+    except KeyError as e:
+        return {'error': 'Unknown quiz ids.', 'quiz_ids': e.args[0]}, 404
+    results = [{'quiz_id': context.quiz.id, 'selected_answer': answer, 'is_correct': is_correct,
+                'correct_answer': context.quiz.correct_answer} for context, answer, is_correct in graded]
+    return {'results': results, 'correct': sum(r['is_correct'] for r in results), 'total': len(results)}
+
+@bp.route('/reports/daily')
+@read_only
+@admin_token_required
+def daily_report():
+    # Reads the materialized rollup only; refresh it with `flask report rollup`
+    days = max(1, min(request.args.get('days', 30, type=int), 366))
+    start = datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+    statement = (
+        select(QuizAttemptDaily.day, db.func.sum(QuizAttemptDaily.attempts), db.func.sum(QuizAttemptDaily.correct))
+        .where(QuizAttemptDaily.day >= start)
+        .group_by(QuizAttemptDaily.day)
+        .order_by(QuizAttemptDaily.day)
+    )
+    quiz_id = request.args.get('quiz_id', type=int)
+    if quiz_id is not None:
+        statement = statement.where(QuizAttemptDaily.quiz_id == quiz_id)
+    return {'days': [{'day': day.isoformat(), 'attempts': attempts, 'correct': correct}
+                     for day, attempts, correct in db.session.execute(statement)]}
+
+@bp.route('/courses/<language_name>')
+@read_only
+@conditional(lambda language_name: catalog_etag('courses', per_user=False),
+             cache_control='public, max-age=60', last_modified=catalog_last_modified)
+def courses_by_language(language_name):
+    language = language_name.capitalize()
+    serialize = COURSE.serializer(('id', 'title', 'level', 'description'))
+    return {'courses': [serialize(c) for c in catalog.courses() if c.language == language]}
+
+@bp.route('/search')
+@login_required
+def search():
+    query, kind = search_request()
+    limit = max(1, min(request.args.get('limit', SEARCH_RESULTS_LIMIT, type=int), 100))
+    results = search_index.search(query, kinds=[kind] if kind else None, limit=limit) if query else []
+    return {'query': query, 'results': [
+        {'kind': hit.kind, 'id': hit.id, 'title': hit.title, 'snippet': str(hit.snippet),
+         'score': round(hit.score, 4), 'url': search_result_url(hit)}
+        for hit in results
+    ]}
@@ -0,0 +1,64 @@
+from flask import Blueprint, current_app, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required, login_user, logout_user
+
+from extensions import db, password_hasher, task_queue
+from forms import LoginForm, RegistrationForm
+from models import User
+
+bp = Blueprint('auth', __name__)
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        try:
+            user = User(email=form.email.data)
+            user.set_password(form.password.data) # Hashed here: the plaintext never reaches the task queue
+            db.session.add(user)
+            db.session.flush()
+            # Committed with the account, sent later by `flask tasks work`
+            task_queue.enqueue('send_email', {
+                'to': user.email,
+                'subject': 'Welcome to LinguaLearn',
+                'body': render_template('email/welcome.txt', email=user.email,
+                                        login_url=url_for('auth.login', _external=True)),
+            }, key=f'welcome-email:{user.id}')
+            db.session.commit()
+            flash('Your account has been created! You are now able to log in.', 'success')
+            return redirect(url_for('auth.login'))
+        except ValueError as e:
+            flash(str(e), 'danger')
+        except Exception as e:
+            db.session.rollback()
+            flash('An error occurred during registration. Please try again.', 'danger')
+            current_app.logger.error(f"Error during registration: {e}")
+    return render_template('register.html', title='Register', form=form)
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = User.query.filter_by(email=form.email.data).first()
+        if user and user.check_password(form.password.data):
+            if password_hasher.needs_rehash(user.password_hash):
+                # Upgrade hashes made with an older method or cost while we have the password
+                user.set_password(form.password.data)
+                db.session.commit()
+            login_user(user, remember=True) # 'remember=True' can be a checkbox in the form
+            next_page = request.args.get('next')
+            flash('Login successful!', 'success')
+            return redirect(next_page) if next_page else redirect(url_for('main.index'))
+        else:
+            flash('Login Unsuccessful. Please check email and password.', 'danger')
+    return render_template('login.html', title='Login', form=form)
+
+@bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('You have been logged out.', 'info')
+    return redirect(url_for('main.index'))
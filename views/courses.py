@@ -0,0 +1,159 @@
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required
+
+from catalog_cache import QuizContext
+from database_profile import read_only
+from extensions import attempt_writer, catalog, review_scheduler
+from http_caching import conditional
+from services import enroll_users, grade_answers, quiz_attempt_row
+from views import catalog_etag, catalog_last_modified
+
+bp = Blueprint('courses', __name__)
+
+REVIEW_PAGE_SIZE = 20
+
+@bp.route('/courses')
+@read_only
+@login_required
+@conditional(lambda: catalog_etag('courses'), last_modified=catalog_last_modified)
+def courses():
+    all_courses = catalog.courses()
+    return render_template('courses.html', title='Courses', courses=all_courses)
+
+@bp.route('/course/<int:course_id>')
+@read_only
+@login_required
+@conditional(lambda course_id: catalog_etag(('course', course_id)), last_modified=catalog_last_modified)
+def course_detail(course_id):
+    course = catalog.course(course_id)
+    if course is None:
+        abort(404)
+    return render_template('course_detail.html', title=course.title, course=course, modules=course.modules)
+
+@bp.route('/lesson/<int:lesson_id>')
+@bp.route('/lesson_view/<int:lesson_id>') # Alias for template consistency
+@read_only
+@login_required
+@conditional(lambda lesson_id: catalog_etag(('lesson', lesson_id)), last_modified=catalog_last_modified)
+def lesson_view(lesson_id):
+    context = catalog.lesson(lesson_id)
+    if context is None:
+        abort(404)
+    lesson, module, course = context.lesson, context.module, context.course
+
+    return render_template('lesson.html', title=lesson.title, lesson=lesson, module=module, course=course)
+
+@bp.route('/quiz/<int:quiz_id>/take', methods=['GET', 'POST'])
+@login_required
+def take_quiz(quiz_id):
+    context = catalog.quiz(quiz_id)
+    if context is None:
+        abort(404)
+    quiz, lesson, module, course = context.quiz, context.lesson, context.module, context.course
+
+    if request.method == 'POST':
+        selected_answer = request.form.get('selected_answer')
+        if not selected_answer:
+            flash('Please select an answer.', 'warning')
+            # Re-render the quiz page if no answer was submitted
+            return render_template('take_quiz.html',
+                                   title=f"Quiz: {quiz.question[:30]}...",
+                                   quiz=quiz,
+                                   options=quiz.options,
+                                   lesson=lesson,
+                                   module=module,
+                                   course=course)
+
+        # Grading is a lookup in the checker compiled when the catalog was loaded
+        is_correct = quiz.checker.grade(selected_answer)
+
+        # Record the quiz attempt (committed now, or batched by the background writer)
+        attempt_writer.submit([quiz_attempt_row(context, current_user.id, selected_answer, is_correct)])
+
+        if is_correct:
+            flash('Correct! Well done.', 'success')
+        else:
+            flash(f'Not quite. The correct answer was: {quiz.correct_answer}', 'danger')
+
+        return redirect(url_for('courses.lesson_view', lesson_id=lesson.id))
+
+    # For GET request, display the quiz
+    return render_template('take_quiz.html',
+                           title=f"Quiz: {quiz.question[:30]}...",
+                           quiz=quiz,
+                           options=quiz.options,
+                           lesson=lesson,
+                           module=module,
+                           course=course)
+
+@bp.route('/lesson/<int:lesson_id>/quiz', methods=['GET', 'POST'])
+@login_required
+def lesson_quiz(lesson_id):
+    # Every quiz of the lesson on one page: the lesson snapshot already holds
+    # them all, and one POST grades every answer and records them as one batch
+    context = catalog.lesson(lesson_id)
+    if context is None or not context.lesson.quizzes:
+        abort(404)
+    lesson, module, course = context.lesson, context.module, context.course
+    quizzes = lesson.quizzes
+    answers = {quiz.id: request.form.get(f'answer-{quiz.id}', '') for quiz in quizzes}
+    results = None
+
+    if request.method == 'POST':
+        if not any(answer.strip() for answer in answers.values()):
+            flash('Please answer at least one question.', 'warning')
+        else:
+            graded = grade_answers(current_user.id, answers,
+                                   {quiz.id: QuizContext(course, module, lesson, quiz) for quiz in quizzes})
+            results = {graded_context.quiz.id: is_correct for graded_context, _, is_correct in graded}
+            correct = sum(results.values())
+            flash(f'You answered {correct} of {len(quizzes)} questions correctly.',
+                  'success' if correct == len(quizzes) else 'info')
+
+    return render_template('lesson_quiz.html',
+                           title=f'Quiz: {lesson.title}',
+                           quizzes=quizzes,
+                           answers=answers,
+                           results=results,
+                           lesson=lesson,
+                           module=module,
+                           course=course)
+
+@bp.route('/review', methods=['GET', 'POST'])
+@login_required
+def review():
+    contexts, answers, results, more_due = None, {}, None, False
+    if request.method == 'POST':
+        answers = {int(key.split('-', 1)[1]): value for key, value in request.form.items()
+                   if key.startswith('answer-') and key.split('-', 1)[1].isdigit()}
+        try:
+            graded = grade_answers(current_user.id, answers)
+        except KeyError:
+            abort(400)
+        if graded:
+            # Show the graded quizzes again with their results; the next GET picks the next due items
+            contexts = [context for context, _, _ in graded]
+            results = {context.quiz.id: is_correct for context, _, is_correct in graded}
+            flash(f'You answered {sum(results.values())} of {len(results)} reviews correctly.', 'info')
+        else:
+            flash('Please answer at least one question.', 'warning')
+    if contexts is None:
+        states, more_due = review_scheduler.due(current_user.id, REVIEW_PAGE_SIZE)
+        contexts = [context for context in map(catalog.quiz, (state.quiz_id for state in states)) if context]
+    next_due_at = None if contexts else review_scheduler.next_due_at(current_user.id)
+    return render_template('review.html', title='Review', contexts=contexts, answers=answers,
+                           results=results, more_due=more_due, next_due_at=next_due_at)
+
+@bp.route('/enroll/<int:course_id>', methods=['POST']) # POST to indicate an action
+@login_required
+def enroll_course(course_id):
+    course = catalog.course(course_id)
+    if course is None:
+        abort(404)
+    # The cached id set answers membership; the insert ignores duplicates in
+    # case another worker enrolled the user since the identity was cached
+    if course.id in current_user.enrolled_course_ids or not enroll_users([current_user.id], [course.id]):
+        flash('You are already enrolled in this course.', 'info')
+    else:
+        flash(f'Successfully enrolled in {course.title}!', 'success')
+    return redirect(url_for('courses.course_detail', course_id=course.id))
@@ -0,0 +1,127 @@
+import base64
+import datetime
+
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required
+from sqlalchemy import select, tuple_, update
+
+from extensions import db
+from forms import FORUM_TOPICS, LANGUAGE_CHOICES, CommentForm, ForumPostForm
+from models import Comment, ForumPost, User
+
+bp = Blueprint('forum', __name__, url_prefix='/forum')
+
+# Boards and threads page on (created_at, id) keysets instead of OFFSET, so the
+# cost of a page does not grow with how deep into a board or thread it is.
+FORUM_PAGE_SIZE = 20
+
+def encode_cursor(created_at, row_id):
+    raw = f'{created_at.isoformat()}|{row_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except ValueError: # Also covers malformed base64 and UTF-8
+        abort(400)
+
+def keyset_page(statement, model, cursor=None, descending=False, page_size=FORUM_PAGE_SIZE):
+    """Run ``statement`` for the page after ``cursor`` in (created_at, id) order.
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    key = tuple_(model.created_at, model.id)
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        statement = statement.where(key < after if descending else key > after)
+    if descending:
+        statement = statement.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        statement = statement.order_by(model.created_at, model.id)
+    rows = db.session.execute(statement.limit(page_size + 1)).all()
+    if len(rows) <= page_size:
+        return rows, None
+    last = rows[page_size - 1]
+    return rows[:page_size], encode_cursor(last.created_at, last.id)
+
+def load_authors(user_ids):
+    # One query for every author on a page instead of one per post or comment
+    ids = set(user_ids)
+    if not ids:
+        return {}
+    return dict(db.session.execute(select(User.id, User.email).where(User.id.in_(ids))).all())
+
+def add_comment(post_id, user_id, content):
+    """Insert a comment and bump the post's denormalized count in one transaction."""
+    comment = Comment(post_id=post_id, user_id=user_id, content=content)
+    db.session.add(comment)
+    db.session.execute(
+        update(ForumPost).where(ForumPost.id == post_id).values(comment_count=ForumPost.comment_count + 1)
+    )
+    db.session.commit()
+    return comment
+
+@bp.route('')
+@login_required
+def board():
+    language = request.args.get('language') or None
+    topic = request.args.get('topic') or None
+    statement = select(
+        ForumPost.id, ForumPost.user_id, ForumPost.title, ForumPost.language, ForumPost.topic,
+        ForumPost.created_at, ForumPost.comment_count,
+    )
+    if language:
+        statement = statement.where(ForumPost.language == language)
+    if topic:
+        statement = statement.where(ForumPost.topic == topic)
+    posts, next_cursor = keyset_page(statement, ForumPost, request.args.get('cursor'), descending=True)
+    authors = load_authors(post.user_id for post in posts)
+    return render_template('forum.html', title='Forum', posts=posts, authors=authors, next_cursor=next_cursor,
+                           language=language, topic=topic, languages=[l for l, _ in LANGUAGE_CHOICES],
+                           topics=FORUM_TOPICS)
+
+@bp.route('/new', methods=['GET', 'POST'])
+@login_required
+def new_post():
+    form = ForumPostForm()
+    if form.validate_on_submit():
+        post = ForumPost(user_id=current_user.id, title=form.title.data, content=form.content.data,
+                         language=form.language.data or None, topic=form.topic.data)
+        db.session.add(post)
+        db.session.commit()
+        flash('Your post has been published.', 'success')
+        return redirect(url_for('forum.thread', post_id=post.id))
+    elif request.method == 'GET':
+        form.language.data = current_user.chosen_language or ''
+    return render_template('forum_new_post.html', title='New Post', form=form)
+
+@bp.route('/post/<int:post_id>')
+@login_required
+def thread(post_id):
+    post = db.session.get(ForumPost, post_id)
+    if post is None:
+        abort(404)
+    statement = select(Comment.id, Comment.user_id, Comment.content, Comment.created_at).where(Comment.post_id == post_id)
+    cursor = request.args.get('cursor')
+    comments, next_cursor = keyset_page(statement, Comment, cursor)
+    authors = load_authors([post.user_id] + [comment.user_id for comment in comments])
+    return render_template('forum_thread.html', title=post.title, post=post, comments=comments, authors=authors,
+                           next_cursor=next_cursor, is_first_page=not cursor, form=CommentForm())
+
+@bp.route('/post/<int:post_id>/reply', methods=['POST'])
+@login_required
+def reply(post_id):
+    if db.session.get(ForumPost, post_id) is None:
+        abort(404)
+    form = CommentForm()
+    if not form.validate_on_submit():
+        flash('Your reply could not be posted: ' + ' '.join(form.content.errors or ['please try again.']), 'danger')
+        return redirect(url_for('forum.thread', post_id=post_id))
+    comment = add_comment(post_id, current_user.id, form.content.data)
+    flash('Your reply has been posted.', 'success')
+    # A cursor just before the new comment opens the page that starts with it
+    return redirect(url_for('forum.thread', post_id=post_id,
+                            cursor=encode_cursor(comment.created_at, comment.id - 1),
+                            _anchor=f'comment-{comment.id}'))
@@ -0,0 +1,106 @@
+import datetime
+import hashlib
+import hmac
+
+from flask import Blueprint, abort, current_app, flash, redirect, render_template, request, url_for
+from flask_login import current_user, login_required
+
+from extensions import catalog, db, identity_cache, request_metrics, search_index, task_queue
+from forms import ContactForm, ProfileUpdateForm
+from models import User
+from services import course_progress
+
+bp = Blueprint('main', __name__)
+
+SEARCH_KINDS = {'course': 'Courses', 'lesson': 'Lessons', 'post': 'Forum posts'}
+SEARCH_RESULTS_LIMIT = 20
+
+@bp.app_context_processor
+def inject_current_year():
+    return {'current_year': datetime.datetime.utcnow().year}
+
+@bp.route('/')
+@bp.route('/index')
+def index():
+    return render_template('index.html', title='Home')
+
+@bp.route('/profile', methods=['GET', 'POST'])
+@login_required
+def profile():
+    form = ProfileUpdateForm()
+    if form.validate_on_submit():
+        user = db.session.get(User, current_user.id)
+        user.chosen_language = form.chosen_language.data
+        db.session.commit()
+        identity_cache.invalidate(user.id)
+        flash('Your profile has been updated!', 'success')
+        return redirect(url_for('main.profile'))
+    elif request.method == 'GET':
+        form.chosen_language.data = current_user.chosen_language
+    progress = sorted(course_progress(current_user.id).values(), key=lambda p: p['course'].title)
+    return render_template('profile.html', title='Profile', form=form, progress=progress)
+
+# Placeholder routes from memory
+@bp.route('/enrolled-courses')
+@login_required
+def enrolled_courses():
+    course_ids = current_user.enrolled_course_ids
+    user_enrolled_courses = [course for course in catalog.courses() if course.id in course_ids]
+    progress = course_progress(current_user.id, course_ids)
+    return render_template('enrolled-courses.html', title='My Courses', enrolled_courses=user_enrolled_courses, progress=progress)
+
+@bp.route('/assignments') # Or quizzes per lesson
+@login_required
+def assignments():
+    return render_template('assignments.html', title='Assignments')
+
+# --- Search ---
+def search_request():
+    query = request.args.get('q', '').strip()
+    kind = request.args.get('kind') or None
+    if kind is not None and kind not in SEARCH_KINDS:
+        abort(400)
+    return query, kind
+
+def search_result_url(hit):
+    if hit.kind == 'course':
+        return url_for('courses.course_detail', course_id=hit.id)
+    if hit.kind == 'lesson':
+        return url_for('courses.lesson_view', lesson_id=hit.id)
+    return url_for('forum.thread', post_id=hit.id)
+
+@bp.route('/search')
+@login_required
+def search():
+    query, kind = search_request()
+    results = search_index.search(query, kinds=[kind] if kind else None, limit=SEARCH_RESULTS_LIMIT) if query else []
+    return render_template('search.html', title='Search', query=query, kind=kind, kinds=SEARCH_KINDS,
+                           results=results, result_url=search_result_url)
+
+@bp.route('/contact', methods=['GET', 'POST'])
+def contact():
+    form = ContactForm()
+    if form.validate_on_submit():
+        fields = {name: form[name].data.strip() for name in ('name', 'email', 'subject', 'message')}
+        # Mailed by a background task; the key drops same-day resubmissions of the same message
+        digest = hashlib.blake2b(repr(sorted(fields.items())).encode('utf-8'), digest_size=12).hexdigest()
+        task_queue.enqueue('send_email', {
+            'to': current_app.config['CONTACT_EMAIL'],
+            'subject': f'[Contact] {fields["subject"]}',
+            'body': render_template('email/contact.txt', **fields),
+            'reply_to': fields['email'],
+        }, key=f'contact:{datetime.date.today().isoformat()}:{digest}')
+        db.session.commit()
+        flash('Thank you for your message! We will get back to you soon.', 'success')
+        return redirect(url_for('main.contact')) # Redirect to clear the form and prevent resubmission
+    return render_template('contact.html', title='Contact Us', form=form), 400 if form.errors else 200
+
+@bp.route('/metrics')
+def metrics():
+    # Prometheus scrape target; only served when METRICS_ENABLED is set
+    if not request_metrics.enabled:
+        abort(404)
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(403)
+    return request_metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
@@ -0,0 +1,8 @@
+"""WSGI entry point, e.g. ``gunicorn --preload --workers 4 wsgi:app``.
+
+With ``--preload`` the app is built once in the master and every worker is
+forked from it, so workers start without importing or configuring anything.
+"""
+from app import create_app
+
+app = create_app()